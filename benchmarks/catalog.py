@@ -0,0 +1,40 @@
+"""The synthetic catalog seeded by the load benchmark and the plan tests.
+
+Deterministic: the same arguments always give the same rows, so runs
+and query plans can be compared.
+"""
+
+from madr.normalization import normalize
+
+WORDS = [
+    'amor', 'mar', 'noite', 'cidade', 'sertão', 'memórias', 'vidas',
+    'cortiço', 'sonho', 'tempo', 'casa', 'rio', 'sol', 'guerra', 'inverno',
+]  # fmt: skip
+
+
+def title(i: int) -> str:
+    return f'{WORDS[i % len(WORDS)]} {WORDS[i // 7 % len(WORDS)]} {i}'
+
+
+def author_rows(authors: int) -> list[dict]:
+    return [
+        {'name': f'Autor {i}', 'name_normalized': f'autor {i}'}
+        for i in range(authors)
+    ]
+
+
+def book_rows(
+    books: int, authors: int, managed_by_user: int | None = None
+) -> list[dict]:
+    """Books spread over the authors and 170 years; one in 100 is managed
+    by ``managed_by_user``, so filtering on it is selective."""
+    return [
+        {
+            'title': title(i),
+            'title_normalized': normalize(title(i)),
+            'year': 1850 + i % 170,
+            'author_id': i % authors + 1,
+            'managed_by_user': managed_by_user if i % 100 == 0 else None,
+        }
+        for i in range(books)
+    ]
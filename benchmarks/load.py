@@ -0,0 +1,243 @@
+"""Throughput and latency of the API under concurrent clients.
+
+Seeds a Postgres with a catalog, boots ``madr.app:app`` on it with
+uvicorn and drives each scenario for ``--duration`` seconds from
+``--concurrency`` clients. Without ``--database-url`` a throwaway
+``postgres:16`` is started with testcontainers, as in the tests. The
+other settings come from ``.env`` or the environment, as for the app,
+except the response cache: it is off unless ``--response-cache``.
+
+The database is dropped and recreated: never point it at real data.
+
+Usage: python -m benchmarks.load [--concurrency 16] [--duration 10]
+       [--authors 200] [--books 5000] [--workers 1]
+       [--database-url URL] [--response-cache] [--output load.json]
+       [--baseline baseline.json] [--tolerance 0.25]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from itertools import count
+from time import perf_counter, sleep
+
+import httpx
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks import report
+from benchmarks.catalog import WORDS, author_rows, book_rows
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'benchmark'
+
+
+@contextmanager
+def database(url: str | None):
+    if url:
+        yield url
+        return
+
+    from testcontainers.postgres import PostgresContainer  # noqa: PLC0415
+
+    with PostgresContainer('postgres:16', driver='psycopg') as postgres:
+        yield postgres.get_connection_url()
+
+
+async def seed(url: str, authors: int, books: int):
+    # madr reads DATABASE_URL when imported
+    os.environ['DATABASE_URL'] = url
+    from madr.models import (  # noqa: PLC0415
+        Author,
+        Book,
+        User,
+        table_registry,
+    )
+    from madr.security import get_password_hash  # noqa: PLC0415
+
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.drop_all)
+        await conn.run_sync(table_registry.metadata.create_all)
+        await conn.execute(
+            insert(User).values(
+                username='bench',
+                email=EMAIL,
+                password=get_password_hash(PASSWORD),
+            )
+        )
+        await conn.execute(insert(Author), author_rows(authors))
+        await conn.execute(insert(Book), book_rows(books, authors))
+        await conn.execute(text('ANALYZE'))
+    await engine.dispose()
+
+
+def wait_until_up(base_url: str, process: subprocess.Popen, timeout=30):
+    deadline = perf_counter() + timeout
+    while perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('The server exited while starting')
+        try:
+            if httpx.get(base_url).is_success:
+                return
+        except httpx.TransportError:
+            pass
+        sleep(0.2)
+    raise RuntimeError(f'The server did not answer in {timeout}s')
+
+
+@contextmanager
+def server(url: str, port: int, workers: int, response_cache: bool):
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            '-m',
+            'uvicorn',
+            'madr.app:app',
+            '--port',
+            str(port),
+            '--workers',
+            str(workers),
+            '--log-level',
+            'warning',
+        ],
+        env={
+            **os.environ,
+            'DATABASE_URL': url,
+            # Off unless asked: the scenarios repeat their requests, and
+            # would mostly measure cache hits instead of the database
+            **({} if response_cache else {'RESPONSE_CACHE_SIZE': '0'}),
+        },
+    )
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        wait_until_up(base_url, process)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def scenarios(token: str, authors: int, books: int) -> dict:
+    """One request per scenario; ``i`` varies the ids and parameters."""
+    auth = {'Authorization': f'Bearer {token}'}
+    return {
+        'login': lambda client, i: client.post(
+            '/auth/token', data={'username': EMAIL, 'password': PASSWORD}
+        ),
+        'list_books': lambda client, i: client.get(
+            '/books/',
+            params={'offset': i * 20 % books, 'limit': 20},
+            headers=auth,
+        ),
+        'filter_books': lambda client, i: client.get(
+            '/books/', params={'title': WORDS[i % len(WORDS)]}, headers=auth
+        ),
+        'search': lambda client, i: client.get(
+            '/search/', params={'q': WORDS[i % len(WORDS)]}, headers=auth
+        ),
+        'author_detail': lambda client, i: client.get(
+            f'/authors/{i % authors + 1}', headers=auth
+        ),
+        'update_book': lambda client, i: client.patch(
+            f'/books/{i % books + 1}',
+            json={'year': 1850 + i % 170},
+            headers=auth,
+        ),
+    }
+
+
+async def drive(client, request, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    numbers = count()
+    started = perf_counter()
+    deadline = started + duration
+
+    async def worker():
+        nonlocal errors
+        while perf_counter() < deadline:
+            start = perf_counter()
+            try:
+                response = await request(client, next(numbers))
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            if response.is_success:
+                latencies.append(perf_counter() - start)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return report.latency_summary(latencies, perf_counter() - started, errors)
+
+
+async def run(base_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        response = await client.post(
+            '/auth/token', data={'username': EMAIL, 'password': PASSWORD}
+        )
+        response.raise_for_status()
+        token = response.json()['access_token']
+
+        requests = scenarios(token, args.authors, args.books)
+        results = {}
+        for name in args.only or requests:
+            request = requests[name]
+            # Warm the pools and caches without recording anything
+            await drive(client, request, args.concurrency, args.warmup)
+            results[name] = await drive(
+                client, request, args.concurrency, args.duration
+            )
+            print(f'{name:>15}: {results[name]}', file=sys.stderr)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=1)
+    parser.add_argument('--authors', type=int, default=200)
+    parser.add_argument('--books', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--database-url')
+    parser.add_argument('--only', nargs='+', help='run just these scenarios')
+    parser.add_argument(
+        '--response-cache',
+        action='store_true',
+        help='keep the response cache on in the server',
+    )
+    report.add_baseline_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with database(args.database_url) as url:
+        asyncio.run(seed(url, args.authors, args.books))
+        with server(
+            url, args.port, args.workers, args.response_cache
+        ) as base_url:
+            results = asyncio.run(run(base_url, args))
+
+    written = report.write(
+        args.output,
+        'load',
+        results,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        authors=args.authors,
+        books=args.books,
+        workers=args.workers,
+        response_cache=args.response_cache,
+    )
+    if args.baseline:
+        return report.check(written, args.baseline, args.tolerance)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Micro-benchmarks of the CPU work done on every request.
+
+Text normalization, token encoding and decoding, password verification
+and list serialization, each timed without the database or the network.
+Reads the same settings as the app (``.env`` or the environment).
+
+Usage: python -m benchmarks.micro [--output micro.json]
+       [--baseline baseline.json] [--tolerance 0.25]
+"""
+
+import argparse
+import sys
+from timeit import Timer
+
+from jwt import decode
+
+from benchmarks import report
+from benchmarks.serialization import make_rows
+from madr import serialization
+from madr.normalization import clean, normalize
+from madr.schemas import BookList
+from madr.security import (
+    create_access_token,
+    get_password_hash,
+    settings,
+    verify_password,
+)
+from madr.serialization import ListSerializer
+
+TITLE = '  Memórias   Póstumas de Brás Cubas! '
+PAGE_ROWS = 100
+
+
+def us_per_op(func, repeat: int = 5) -> float:
+    """Best of ``repeat`` runs, each long enough to be measurable."""
+    timer = Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def page_dump(fast: bool):
+    book_list = ListSerializer(BookList, 'books')
+    rows = make_rows(book_list, PAGE_ROWS)
+
+    def dump():
+        serialization.settings.FAST_SERIALIZATION = fast
+        return book_list.dump(rows)
+
+    return dump
+
+
+def benchmarks() -> dict:
+    token = create_access_token({'sub': 'reader@example.com'})
+    password_hash = get_password_hash('benchmark')
+    return {
+        'clean': lambda: clean(TITLE),
+        'normalize': lambda: normalize(TITLE),
+        'token_encode': lambda: create_access_token({
+            'sub': 'reader@example.com'
+        }),
+        'token_decode': lambda: decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        ),
+        'password_verify': lambda: verify_password('benchmark', password_hash),
+        f'serialize_{PAGE_ROWS}_rows': page_dump(fast=False),
+        f'serialize_{PAGE_ROWS}_rows_fast': page_dump(fast=True),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    report.add_baseline_arguments(parser)
+    args = parser.parse_args(argv)
+
+    results = {
+        name: {'us_per_op': us_per_op(func)}
+        for name, func in benchmarks().items()
+    }
+    written = report.write(args.output, 'micro', results)
+    if args.baseline:
+        return report.check(written, args.baseline, args.tolerance)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Benchmark results as JSON, and their comparison with a stored baseline.
+
+Every benchmark writes ``{"benchmark": ..., "results": {name: metrics}}``.
+A metric regresses when it is worse than the baseline by more than the
+tolerance: latencies and per-operation times going up, throughput going
+down.
+
+Usage: python -m benchmarks.report results.json baseline.json
+       [--tolerance 0.25]
+"""
+
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+from statistics import quantiles
+
+LOWER_IS_BETTER = {'p50_ms', 'p99_ms', 'us_per_op'}
+HIGHER_IS_BETTER = {'throughput'}
+
+
+def latency_summary(latencies: list[float], seconds: float, errors: int):
+    """Throughput and percentiles of ``latencies``, given in seconds."""
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / seconds,
+        'p50_ms': None,
+        'p99_ms': None,
+    }
+    if len(latencies) > 1:
+        cuts = quantiles(latencies, n=100, method='inclusive')
+        summary.update(p50_ms=cuts[49] * 1000, p99_ms=cuts[98] * 1000)
+    return summary
+
+
+def write(path: str | None, benchmark: str, results: dict, **parameters):
+    report = {
+        'benchmark': benchmark,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'parameters': parameters,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if path:
+        Path(path).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+    return report
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    """Lines describing each metric worse than ``baseline`` allows."""
+    found = []
+    for name, metrics in report['results'].items():
+        expected = baseline['results'].get(name, {})
+        for metric, value in metrics.items():
+            before = expected.get(metric)
+            if not (value and before):
+                continue
+            change = (value - before) / before
+            if (metric in LOWER_IS_BETTER and change > tolerance) or (
+                metric in HIGHER_IS_BETTER and change < -tolerance
+            ):
+                found.append(
+                    f'{name}.{metric}: {before:.2f} -> {value:.2f}'
+                    f' ({change:+.0%})'
+                )
+    return found
+
+
+def check(report: dict, baseline_path: str, tolerance: float) -> int:
+    """Print the regressions against ``baseline_path``; 1 if any."""
+    baseline = json.loads(Path(baseline_path).read_text(encoding='utf-8'))
+    found = regressions(report, baseline, tolerance)
+    for line in found:
+        print(f'regression: {line}', file=sys.stderr)
+    return 1 if found else 0
+
+
+def add_baseline_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--output', help='write the JSON here, not stdout')
+    parser.add_argument('--baseline', help='JSON of a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('results')
+    parser.add_argument('baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    report = json.loads(Path(args.results).read_text(encoding='utf-8'))
+    return check(report, args.baseline, args.tolerance)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Per-row cost of encoding a list page, with and without the fast path.
+
+Compares the ``response_model`` path FastAPI takes for a returned dict
+(validation, ``jsonable_encoder``, ``json.dumps``) with ``ListSerializer``
+validating and with ``FAST_SERIALIZATION`` turned on.
+
+Usage: python -m benchmarks.serialization [--rows 1000] [--repeat 20]
+"""
+
+import argparse
+import json
+from datetime import datetime
+from timeit import timeit
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.engine.result import result_tuple
+
+from madr import serialization
+from madr.schemas import BookList
+from madr.serialization import ListSerializer
+
+
+def make_rows(book_list: ListSerializer, count: int) -> list:
+    make_row = result_tuple(book_list.item_fields)
+    now = datetime.now()
+    return [
+        make_row((f'title {i}', 1900 + i % 100, i, i, now, now))
+        for i in range(count)
+    ]
+
+
+def response_model(rows) -> bytes:
+    page = BookList.model_validate(
+        {'books': rows, 'next_cursor': None}, from_attributes=True
+    )
+    return json.dumps(jsonable_encoder(page)).encode()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    book_list = ListSerializer(BookList, 'books')
+    rows = make_rows(book_list, args.rows)
+
+    def validated():
+        serialization.settings.FAST_SERIALIZATION = False
+        return book_list.dump(rows)
+
+    def fast():
+        serialization.settings.FAST_SERIALIZATION = True
+        return book_list.dump(rows)
+
+    for name, encode in [
+        ('response_model', lambda: response_model(rows)),
+        ('validated', validated),
+        ('fast', fast),
+    ]:
+        seconds = timeit(encode, number=args.repeat) / args.repeat
+        print(f'{name:>15}: {seconds / args.rows * 1e6:6.2f} µs/row')
+
+
+if __name__ == '__main__':
+    main()
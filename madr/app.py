@@ -1,16 +1,50 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from http import HTTPStatus
 
 from fastapi import FastAPI
 
-from madr.routers import auth, authors, books, users
+from madr.database import (
+    ReadYourWritesMiddleware,
+    replicas,
+    session_factory,
+    settings,
+)
+from madr.metrics import MetricsMiddleware
+from madr.routers import auth, authors, books, metrics, search, stats, users
 from madr.schemas import Message
+from madr.security import token_versions
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not settings.STATELESS_AUTH:
+        yield
+        return
+
+    refresher = asyncio.create_task(
+        token_versions.refresh_forever(session_factory)
+    )
+    yield
+    refresher.cancel()
+    with suppress(asyncio.CancelledError):
+        await refresher
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+if replicas:
+    app.add_middleware(
+        ReadYourWritesMiddleware, seconds=settings.READ_YOUR_WRITES_SECONDS
+    )
 
 app.include_router(auth.router)
 app.include_router(books.router)
 app.include_router(authors.router)
 app.include_router(users.router)
+app.include_router(search.router)
+app.include_router(stats.router)
+app.include_router(metrics.router)
 
 
 @app.get('/', status_code=HTTPStatus.OK, response_model=Message)
@@ -1,11 +1,238 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+from time import perf_counter
 
+from fastapi import Depends, Request
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from starlette.datastructures import MutableHeaders
+
+from madr.metrics import pool_checkout_wait
 from madr.settings import Settings
 
-engine = create_engine(Settings().DATABASE_URL)
 
+class PoolWaitStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, seconds: float):
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        pool_checkout_wait.observe(seconds)
+
+
+class InstrumentedPoolMixin:
+    """Times every connection checkout, including the wait for a free slot."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.timeouts += 1
+            raise
+        finally:
+            self.wait_stats.record(perf_counter() - start)
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(InstrumentedPoolMixin, NullPool):
+    pass
+
+
+def engine_options(settings: Settings) -> dict:
+    options = {'pool_pre_ping': settings.DATABASE_POOL_PRE_PING}
+    if settings.DATABASE_NULL_POOL:
+        options['poolclass'] = InstrumentedNullPool
+        return options
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+    )
+    return options
+
+
+class ReplicaSet:
+    """Session factories for the read replicas, and which to use next.
+
+    ``round_robin`` takes them in turn; ``least_connections`` takes the
+    one with the fewest sessions open by this process.
+    """
+
+    def __init__(self, engines, strategy: str = 'round_robin'):
+        self.factories = [
+            async_sessionmaker(engine, expire_on_commit=False)
+            for engine in engines
+        ]
+        self.strategy = strategy
+        self.in_use = [0] * len(self.factories)
+        self._turn = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.factories)
+
+    def pick(self) -> int:
+        if self.strategy == 'least_connections':
+            return self.in_use.index(min(self.in_use))
+        index = self._turn % len(self.factories)
+        self._turn += 1
+        return index
+
+    @asynccontextmanager
+    async def session(self):
+        index = self.pick()
+        self.in_use[index] += 1
+        try:
+            async with self.factories[index]() as session:
+                # What it reads may lag: see response_cache.may_store
+                session.info['replica'] = True
+                yield session
+        finally:
+            self.in_use[index] -= 1
+
+
+settings = Settings()
+engine = create_async_engine(settings.DATABASE_URL, **engine_options(settings))
+session_factory = async_sessionmaker(engine, expire_on_commit=False)
+replicas = ReplicaSet(
+    [
+        create_async_engine(url, **engine_options(settings))
+        for url in settings.DATABASE_REPLICA_URLS
+    ],
+    settings.DATABASE_REPLICA_STRATEGY,
+)
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+# Set after a write so the same client reads it back from the primary
+PRIMARY_COOKIE = 'madr_primary'
+# Sent by clients that cannot afford a lagging replica for one request
+CONSISTENCY_HEADER = 'X-Read-Consistency'
 
-def get_session():  # pragma: no cover
-    with Session(engine) as session:
+
+def pool_status(pool=None) -> dict:
+    pool = pool or engine.pool
+    status = {
+        'pool_class': type(pool).__name__,
+        'size': None,
+        'checked_in': None,
+        'checked_out': None,
+        'overflow': None,
+    }
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+        )
+
+    wait_stats = getattr(pool, 'wait_stats', None) or PoolWaitStats()
+    status.update(
+        checkouts=wait_stats.checkouts,
+        timeouts=wait_stats.timeouts,
+        wait_seconds_total=wait_stats.wait_seconds_total,
+        wait_seconds_max=wait_stats.wait_seconds_max,
+    )
+    return status
+
+
+def violated_constraint(error: IntegrityError) -> str | None:
+    diag = getattr(error.orig, 'diag', None)
+    return getattr(diag, 'constraint_name', None)
+
+
+async def get_session():  # pragma: no cover
+    async with session_factory() as session:
         yield session
+
+
+def wants_primary(request: Request) -> bool:
+    return (
+        request.method not in SAFE_METHODS
+        or PRIMARY_COOKIE in request.cookies
+        or request.headers.get(CONSISTENCY_HEADER) == 'primary'
+    )
+
+
+@asynccontextmanager
+async def read_session(
+    request: Request, primary: AsyncSession, replica_set: ReplicaSet
+):
+    if replica_set and not wants_primary(request):
+        async with replica_set.session() as session:
+            yield session
+    else:
+        yield primary
+
+
+async def get_read_session(
+    request: Request, session: AsyncSession = Depends(get_session)
+):
+    """For handlers that only read: a replica when any is configured.
+
+    Writes, clients that wrote in the last ``READ_YOUR_WRITES_SECONDS``
+    and requests asking for ``X-Read-Consistency: primary`` still get
+    the primary, as the very ``get_session`` session of the request: a
+    write and the user lookup it depends on share one connection. That
+    session opens no connection when a replica serves the request.
+    """
+    async with read_session(request, session, replicas) as read:
+        yield read
+
+
+class ReadYourWritesMiddleware:
+    """Sends clients to the primary for a while after they write.
+
+    Replicas apply the primary's changes with some lag: without this a
+    client could create a book and not find it in the list right after.
+    """
+
+    def __init__(self, app, seconds: float):
+        self.app = app
+        self.cookie = (
+            f'{PRIMARY_COOKIE}=1; Max-Age={round(seconds)}; Path=/; '
+            'HttpOnly; SameSite=Lax'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message['type'] == 'http.response.start' and (
+                message['status'] < 400  # noqa: PLR2004
+            ):
+                MutableHeaders(scope=message).append('Set-Cookie', self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+def get_session_factory():  # pragma: no cover
+    """For responses that outlive the handler, such as streamed bodies.
+
+    The ``get_session`` session is closed once the handler returns, so a
+    streaming response opens its own session from this factory instead.
+    """
+    return session_factory
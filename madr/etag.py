@@ -0,0 +1,76 @@
+import hashlib
+from datetime import datetime
+from http import HTTPStatus
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import false
+
+
+def entity_etag(entity_id: int, updated_at: datetime) -> str:
+    """Strong ETag of a single row: it changes whenever the row does."""
+    return f'"{entity_id}.{updated_at:%Y%m%d%H%M%S%f}"'
+
+
+def collection_etag(versions, *params) -> str:
+    """Weak ETag of a page of a collection, from the rows it serves.
+
+    ``versions`` identifies each row served, such as ``(id, updated_at)``
+    plus the ``updated_at`` of what is embedded in it. Taken from the
+    page already read, it costs no query over the rest of the collection.
+    """
+    digest = hashlib.blake2b(
+        repr((list(versions), params)).encode(), digest_size=12
+    )
+    return f'W/"{digest.hexdigest()}"'
+
+
+precondition_failed = HTTPException(
+    status_code=HTTPStatus.PRECONDITION_FAILED,
+    detail='Resource has been modified',
+)
+
+
+def _tags(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(',') if tag.strip()]
+
+
+def _weak(tag: str) -> str:
+    return tag.removeprefix('W/')
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """The 304 response to send if ``If-None-Match`` already has ``etag``."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return None
+
+    tags = _tags(header)
+    if '*' in tags or _weak(etag) in {_weak(tag) for tag in tags}:
+        return Response(
+            status_code=HTTPStatus.NOT_MODIFIED, headers={'ETag': etag}
+        )
+
+    return None
+
+
+def if_match_criteria(request: Request, entity_id: int, updated_at_column):
+    """WHERE criteria that hold only for the versions ``If-Match`` names.
+
+    They let a conditional UPDATE or DELETE check its precondition in
+    the same statement. Without the header, or with ``*``, there is
+    nothing to check.
+    """
+    header = request.headers.get('if-match')
+    if not header or '*' in _tags(header):
+        return []
+
+    versions = []
+    for tag in _tags(header):
+        tag_id, _, timestamp = tag.strip('"').partition('.')
+        try:
+            if int(tag_id) == entity_id:
+                versions.append(datetime.strptime(timestamp, '%Y%m%d%H%M%S%f'))
+        except ValueError:
+            continue
+
+    return [updated_at_column.in_(versions) if versions else false()]
@@ -0,0 +1,53 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class Explain(Executable, ClauseElement):
+    """``EXPLAIN (FORMAT JSON)`` of a statement; executes to the plan list.
+
+    With ``analyze`` the statement really runs, so keep it to SELECTs.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement, analyze: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(Explain, 'postgresql')
+def _compile_explain(element: Explain, compiler, **kw):
+    options = 'ANALYZE, FORMAT JSON' if element.analyze else 'FORMAT JSON'
+    return f'EXPLAIN ({options}) ' + compiler.process(element.statement, **kw)
+
+
+async def plan(session, statement, analyze: bool = False) -> dict:
+    """The root node of ``statement``'s plan."""
+    (result,) = await session.scalar(Explain(statement, analyze))
+    return result['Plan']
+
+
+def walk(node: dict):
+    """``node`` and every node under it, depth first."""
+    yield node
+    for child in node.get('Plans', ()):
+        yield from walk(child)
+
+
+def scans(node: dict) -> list[str]:
+    """How each relation is read, e.g. ``Index Scan using books_pkey``.
+
+    Only the scan nodes: joins, sorts and aggregates around them vary
+    more between versions of the planner than the access paths do.
+    """
+    found = []
+    for each in walk(node):
+        if 'Relation Name' not in each and 'Index Name' not in each:
+            continue
+        scan = each['Node Type']
+        if 'Relation Name' in each:
+            scan += f' on {each["Relation Name"]}'
+        if 'Index Name' in each:
+            scan += f' using {each["Index Name"]}'
+        found.append(scan)
+    return found
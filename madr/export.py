@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from fastapi.responses import StreamingResponse
+
+FORMATS = ('ndjson', 'csv')
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+BATCH_SIZE = 1000
+
+
+def _to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _encode(rows, fmt: str, fields) -> str:
+    if fmt == 'ndjson':
+        return ''.join(
+            json.dumps(dict(zip(fields, row)), default=_to_json) + '\n'
+            for row in rows
+        )
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in row
+        ]
+        for row in rows
+    )
+    return buffer.getvalue()
+
+
+async def _stream(session_factory, query, fmt: str):
+    fields = [column.name for column in query.selected_columns]
+    if fmt == 'csv':
+        yield _encode([fields], fmt, fields)
+
+    async with session_factory() as session:
+        # A server-side cursor: only BATCH_SIZE rows are in memory at once
+        result = await session.stream(
+            query.execution_options(yield_per=BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            yield _encode(rows, fmt, fields)
+
+
+def export_response(session_factory, query, fmt: str, filename: str):
+    """Stream the rows of a column ``query`` as NDJSON or CSV."""
+    return StreamingResponse(
+        _stream(session_factory, query, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'
+        },
+    )
@@ -0,0 +1,251 @@
+"""In-process metrics, served in the Prometheus text format at /metrics.
+
+Counters and histograms live in this process only: with several workers
+each one answers with its own numbers, so scrape them one by one or
+sum them in Prometheus.
+"""
+
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from madr.query_budget import QueryLog, check_budget, current_queries
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)  # fmt: skip
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _labels(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        lines.extend(
+            f'{name}{labels} {value}' for name, labels, value in self.samples()
+        )
+        return lines
+
+
+class Counter(Metric):
+    """A value the code adds to, or reads from ``callback`` when rendered.
+
+    The callback suits numbers something else already keeps, such as the
+    pool statistics; it returns None when there is nothing to report.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=(), callback=None):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        if self.callback:
+            value = self.callback()
+            if value is not None:
+                yield self.name, '', value
+            return
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, _labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or (
+                [0] * (len(self.buckets) + 1),
+                0,
+            )
+            # Counts per bucket here, cumulated when rendered
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = [
+                (key, list(counts), total)
+                for key, (counts, total) in self._values.items()
+            ]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                labels = _labels(self.labelnames, key, f'le="{bound}"')
+                yield f'{self.name}_bucket', labels, cumulative
+            labels = _labels(self.labelnames, key)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, *extra: Metric) -> str:
+        lines = []
+        for metric in (*self.metrics, *extra):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+requests_in_flight = registry.register(
+    Gauge('madr_http_requests_in_flight', 'Requests being handled.')
+)
+request_duration = registry.register(
+    Histogram(
+        'madr_http_request_duration_seconds',
+        'Time to send the response, by route template and status.',
+        ('method', 'route', 'status'),
+    )
+)
+queries_per_request = registry.register(
+    Histogram(
+        'madr_db_queries_per_request',
+        'SQL statements executed while handling one request.',
+        ('route',),
+        QUERY_COUNT_BUCKETS,
+    )
+)
+query_duration = registry.register(
+    Histogram(
+        'madr_db_query_duration_seconds',
+        'Time from sending a statement to its result, as seen by SQLAlchemy.',
+    )
+)
+password_hash_duration = registry.register(
+    Histogram(
+        'madr_password_hash_duration_seconds',
+        'Argon2 work in the hashing pool, by operation.',
+        ('operation',),
+    )
+)
+pool_checkout_wait = registry.register(
+    Histogram(
+        'madr_db_pool_checkout_wait_seconds',
+        'Time waiting for a database connection from the pool.',
+    )
+)
+
+
+# The start time lives on the execution context, which is dropped with
+# the statement: one that raises never reaches after_cursor_execute
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, cursor, statement, parameters, context, executemany):  # noqa: PLR0913, PLR0917
+    if context is not None:
+        context.madr_query_started = perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_query(conn, cursor, statement, parameters, context, executemany):  # noqa: PLR0913, PLR0917
+    started = getattr(context, 'madr_query_started', None)
+    if started is None:
+        return
+    seconds = perf_counter() - started
+    query_duration.observe(seconds)
+    if (log := current_queries.get()) is not None:
+        log.record(statement, seconds)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and checks the queries it runs.
+
+    Plain ASGI rather than ``BaseHTTPMiddleware``: the handler runs in the
+    same task, so the SQLAlchemy events see this request's context.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        queries = QueryLog()
+        token = current_queries.set(queries)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        requests_in_flight.inc()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_flight.dec()
+            current_queries.reset(token)
+            # Set by FastAPI once routed; the template keeps the label set
+            # small, unlike the raw path
+            route = scope.get('route')
+            template = route.path if route else 'unmatched'
+            request_duration.observe(
+                perf_counter() - start,
+                method=scope['method'],
+                route=template,
+                status=status,
+            )
+            queries_per_request.observe(
+                len(queries.statements), route=template
+            )
+            check_budget(queries, template)
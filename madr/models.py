@@ -1,19 +1,40 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, func
-from sqlalchemy.orm import Mapped, mapped_column, registry, relationship
+from sqlalchemy import DDL, ForeignKey, Index, event, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import (
+    Mapped,
+    mapped_column,
+    registry,
+    relationship,
+    validates,
+)
+
+from madr.normalization import normalize
 
 table_registry = registry()
 
+event.listen(
+    table_registry.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm'),
+)
+
 
 @table_registry.mapped_as_dataclass
 class User:
     __tablename__ = 'users'
+    # The token versions reload only the users changed since the last time
+    __table_args__ = (Index('ix_users_updated_at', 'updated_at'),)
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     username: Mapped[str] = mapped_column(unique=True)
     password: Mapped[str]
     email: Mapped[str] = mapped_column(unique=True)
+    # Bumped to revoke every token issued to the user so far
+    token_version: Mapped[int] = mapped_column(
+        init=False, default=0, server_default='0'
+    )
     created_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now()
     )
@@ -29,9 +50,40 @@ class User:
     )
 
 
+@table_registry.mapped_as_dataclass
+class DeletedUser:
+    """Left behind by a deleted user, for the token versions reload to
+    forget it. Kept until every token issued to the user has expired."""
+
+    __tablename__ = 'deleted_users'
+    __table_args__ = (Index('ix_deleted_users_deleted_at', 'deleted_at'),)
+
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    deleted_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now()
+    )
+
+
 @table_registry.mapped_as_dataclass
 class Book:
     __tablename__ = 'books'
+    __table_args__ = (
+        Index(
+            'ix_books_title_normalized_trgm',
+            'title_normalized',
+            postgresql_using='gin',
+            postgresql_ops={'title_normalized': 'gin_trgm_ops'},
+        ),
+        Index(
+            'ix_books_search_vector', 'search_vector', postgresql_using='gin'
+        ),
+        # Foreign keys: deleting an author or a user updates its books
+        # through these instead of scanning the table. The trailing
+        # columns serve the filters and the keyset sorts of list_books
+        Index('ix_books_author_id_year', 'author_id', 'year'),
+        Index('ix_books_managed_by_user', 'managed_by_user'),
+        Index('ix_books_year_id', 'year', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     title: Mapped[str]
@@ -48,17 +100,39 @@ class Book:
     updated_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now(), onupdate=func.now()
     )
+    # Set with title: see madr.normalization
+    title_normalized: Mapped[str] = mapped_column(init=False, unique=True)
+    # Maintained by the books_search_vector trigger (title + author name)
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR, init=False, nullable=True, deferred=True
+    )
 
     user: Mapped[User] = relationship(init=False, back_populates='books')
     author: Mapped['Author'] = relationship(init=False, back_populates='books')
 
+    @validates('title')
+    def _normalize_title(self, key, title):
+        self.title_normalized = normalize(title)
+        return title
+
 
 @table_registry.mapped_as_dataclass
 class Author:
     __tablename__ = 'authors'
+    __table_args__ = (
+        Index(
+            'ix_authors_name_normalized_trgm',
+            'name_normalized',
+            postgresql_using='gin',
+            postgresql_ops={'name_normalized': 'gin_trgm_ops'},
+        ),
+        Index('ix_authors_managed_by_user', 'managed_by_user'),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     name: Mapped[str]
+    # Set with name: see madr.normalization
+    name_normalized: Mapped[str] = mapped_column(init=False, unique=True)
     managed_by_user: Mapped[int] = mapped_column(
         ForeignKey('users.id', ondelete='SET NULL'), nullable=True
     )
@@ -71,5 +145,55 @@ class Author:
 
     user: Mapped[User] = relationship(init=False, back_populates='authors')
     books: Mapped[list[Book]] = relationship(
-        init=False, back_populates='author'
+        init=False, back_populates='author', order_by=Book.id
     )
+
+    @validates('name')
+    def _normalize_name(self, key, name):
+        self.name_normalized = normalize(name)
+        return name
+
+
+SEARCH_VECTOR_DDL = {
+    Book.__table__: [
+        """
+        CREATE OR REPLACE FUNCTION books_search_vector_update()
+        RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A')
+                || setweight(to_tsvector('simple', coalesce(
+                    (SELECT name FROM authors WHERE id = NEW.author_id), ''
+                )), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER books_search_vector
+        BEFORE INSERT OR UPDATE OF title, author_id ON books
+        FOR EACH ROW EXECUTE FUNCTION books_search_vector_update()
+        """,
+    ],
+    Author.__table__: [
+        """
+        CREATE OR REPLACE FUNCTION authors_search_vector_update()
+        RETURNS trigger AS $$
+        BEGIN
+            UPDATE books SET title = title WHERE author_id = NEW.id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER authors_search_vector
+        AFTER UPDATE OF name ON authors
+        FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+        EXECUTE FUNCTION authors_search_vector_update()
+        """,
+    ],
+}
+
+for table, statements in SEARCH_VECTOR_DDL.items():
+    for statement in statements:
+        event.listen(table, 'after_create', DDL(statement))
@@ -0,0 +1,68 @@
+"""Text normalization shared by the API and the importer.
+
+Titles and names are stored twice: as typed, only tidied by ``clean``,
+for display; and folded by ``normalize`` into the indexed column that
+equality, uniqueness and filters use.
+"""
+
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r'\s+')
+# Accents are dropped from these scripts only: elsewhere combining marks
+# tell words apart (か/が, क/कि)
+_FOLDED_SCRIPTS = ('LATIN', 'GREEK', 'CYRILLIC')
+# The common case: nothing to decide per character
+_NOT_WORD = re.compile(r'[^\w\s]')
+
+
+class _Kinds(dict):
+    """``mark``, ``drop`` (punctuation, symbols), ``folded`` or ``keep``,
+    by character, worked out on first sight."""
+
+    def __missing__(self, char: str) -> str:
+        if unicodedata.category(char).startswith('M'):
+            kind = 'mark'
+        elif not (char.isalnum() or char == '_' or char.isspace()):
+            kind = 'drop'
+        elif unicodedata.name(char, '').startswith(_FOLDED_SCRIPTS):
+            kind = 'folded'
+        else:
+            kind = 'keep'
+        self[char] = kind
+        return kind
+
+
+_kinds = _Kinds()
+
+
+def clean(value: str) -> str:
+    """Display form: NFC composed, whitespace collapsed and trimmed."""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', value)).strip()
+
+
+def normalize(value: str) -> str:
+    """Comparison form: no accents, punctuation or case, single spaces.
+
+    >>> normalize('  Memórias Póstumas de Brás Cubas! ')
+    'memorias postumas de bras cubas'
+    """
+    decomposed = unicodedata.normalize('NFKD', value.casefold())
+    if decomposed.isascii():
+        return _WHITESPACE.sub(' ', _NOT_WORD.sub('', decomposed)).strip()
+
+    kept = []
+    drop_marks = False
+    for char in decomposed:
+        kind = _kinds[char]
+        if kind == 'mark':
+            if not drop_marks:
+                kept.append(char)
+            continue
+        # Marks go with the character before them
+        drop_marks = kind != 'keep'
+        if kind != 'drop':
+            kept.append(char)
+
+    composed = unicodedata.normalize('NFC', ''.join(kept))
+    return _WHITESPACE.sub(' ', composed).strip()
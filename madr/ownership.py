@@ -0,0 +1,36 @@
+from fastapi import HTTPException
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from madr.etag import precondition_failed
+
+
+def writable_by(model, user_id: int):
+    """Rows ``user_id`` may change: its own and the ones nobody manages."""
+    return or_(
+        model.managed_by_user == user_id, model.managed_by_user.is_(None)
+    )
+
+
+async def refusal(  # noqa
+    session: AsyncSession,
+    model,
+    entity_id: int,
+    user_id: int,
+    not_found: HTTPException,
+    forbidden: HTTPException,
+) -> HTTPException:
+    """Tell why a guarded UPDATE or DELETE of ``entity_id`` hit no row.
+
+    Only runs on that failure path: a successful write stays a single
+    statement.
+    """
+    owner = await session.execute(
+        select(model.managed_by_user).where(model.id == entity_id)
+    )
+    row = owner.first()
+    if row is None:
+        return not_found
+    if row.managed_by_user not in {None, user_id}:
+        return forbidden
+    return precondition_failed
@@ -0,0 +1,137 @@
+import base64
+import json
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, any_, bindparam, func, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from madr.explain import plan
+
+COUNT_MODES = ('none', 'exact', 'estimate')
+MAX_IDS = 500
+
+invalid_cursor = HTTPException(
+    status_code=HTTPStatus.BAD_REQUEST, detail='Invalid cursor'
+)
+too_many_ids = HTTPException(
+    status_code=HTTPStatus.BAD_REQUEST,
+    detail=f'At most {MAX_IDS} ids per request',
+)
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise invalid_cursor
+        return [
+            column.type.python_type(value)
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise invalid_cursor
+
+
+def paginate(  # noqa
+    query, columns, cursor=None, offset=None, limit=None, descending=False
+):
+    """Order ``query`` by ``columns`` and apply the requested page.
+
+    With a ``cursor`` the page starts right after the row it encodes
+    (keyset pagination, served by the index on ``columns``); otherwise
+    ``offset`` is used as before. ``descending`` reverses every column,
+    so the row comparison still matches the order.
+    """
+    if descending:
+        query = query.order_by(*(column.desc() for column in columns))
+    else:
+        query = query.order_by(*columns)
+
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if len(columns) == 1:
+            left, right = columns[0], values[0]
+        else:
+            left, right = tuple_(*columns), tuple_(*values)
+        query = query.where(left < right if descending else left > right)
+    else:
+        query = query.offset(offset)
+
+    return query.limit(limit)
+
+
+def next_cursor(rows, keys, limit):
+    if not limit or len(rows) < limit:
+        return None
+
+    return encode_cursor(getattr(rows[-1], key) for key in keys)
+
+
+def page_total(rows, offset=None, limit=None, cursor=None) -> int | None:
+    """The total when the page read already shows where the rows end.
+
+    That is a page shorter than ``limit`` reached by offset: everything
+    before it was skipped, nothing comes after it.
+    """
+    if cursor or (limit and len(rows) >= limit) or (offset and not rows):
+        return None
+    return (offset or 0) + len(rows)
+
+
+async def total_count(
+    session, query, mode: str, known: int | None = None
+) -> int | None:
+    """How many rows ``query`` selects before paging, as ``mode`` asks.
+
+    ``exact`` runs a COUNT with the same filters, unless the total is
+    ``known`` from the page (see ``page_total``). ``estimate`` only asks
+    the planner, which is instant but as good as the table statistics.
+    """
+    query = query.order_by(None)
+    if mode == 'exact' and known is not None:
+        return known
+    if mode == 'exact':
+        return await session.scalar(
+            select(func.count()).select_from(query.subquery())
+        )
+    if mode == 'estimate':
+        return round((await plan(session, query))['Plan Rows'])
+    return None
+
+
+def total_headers(total: int | None, mode: str) -> dict:
+    if total is None:
+        return {}
+    headers = {'X-Total-Count': str(total)}
+    if mode == 'estimate':
+        headers['X-Total-Count-Estimated'] = 'true'
+    return headers
+
+
+async def fetch_by_ids(session, query, id_column, ids: list[int]):
+    """Rows of ``query`` with these ids, in the order asked, and the misses.
+
+    A single ``= ANY(:ids)`` bound to one array, however many ids there
+    are; repeated ids are returned once.
+    """
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_IDS:
+        raise too_many_ids
+
+    rows = await session.execute(
+        query.where(
+            id_column == any_(bindparam('ids', ids, type_=ARRAY(Integer)))
+        )
+    )
+    by_id = {row.id: row for row in rows}
+    return (
+        [by_id[id] for id in ids if id in by_id],
+        [id for id in ids if id not in by_id],
+    )
@@ -0,0 +1,152 @@
+"""How many SQL statements a request may run, and how long they may take.
+
+``MetricsMiddleware`` gives every request a ``QueryLog`` and logs a
+warning when it goes over the budget set in the settings. In tests,
+``query_budget`` turns the same checks into a failure.
+
+A statement shape run more than ``repeat_limit`` times is the usual sign
+of an N+1: one query per row of a list instead of one for the list.
+"""
+
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from madr.settings import Settings
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+# Lists of placeholders, as rendered for IN (...) and multi-row VALUES
+_PLACEHOLDERS = re.compile(r'%\(\w+\)s(?:, %\(\w+\)s)*')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def shape(statement: str) -> str:
+    """``statement`` with each list of placeholders collapsed into one.
+
+    >>> shape('SELECT 1 WHERE id IN (%(id_1_1)s, %(id_1_2)s)')
+    'SELECT 1 WHERE id IN (?)'
+    """
+    return _WHITESPACE.sub(' ', _PLACEHOLDERS.sub('?', statement)).strip()
+
+
+@dataclass
+class QueryLog:
+    statements: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def record(self, statement: str, seconds: float):
+        self.statements.append(statement)
+        self.seconds += seconds
+
+    def repeated(self, limit: int) -> dict[str, int]:
+        """Shapes run more than ``limit`` times, with how many times."""
+        counts = Counter(shape(statement) for statement in self.statements)
+        return {text: count for text, count in counts.items() if count > limit}
+
+    def problems(
+        self,
+        max_statements: int | None,
+        max_seconds: float | None,
+        repeat_limit: int | None,
+    ) -> list[str]:
+        """What goes over the given limits; a falsy limit is not checked."""
+        found = []
+        if max_statements and len(self.statements) > max_statements:
+            found.append(
+                f'{len(self.statements)} statements, budget {max_statements}'
+            )
+        if max_seconds and self.seconds > max_seconds:
+            found.append(
+                f'{self.seconds:.3f}s in the database, budget {max_seconds}s'
+            )
+        if repeat_limit:
+            found.extend(
+                f'{count} times: {text}'
+                for text, count in self.repeated(repeat_limit).items()
+            )
+        return found
+
+
+# The log of the request being handled; None outside of one
+current_queries: ContextVar[QueryLog | None] = ContextVar(
+    'current_queries', default=None
+)
+
+
+def check_budget(log: QueryLog, route: str):
+    problems = log.problems(
+        settings.QUERY_BUDGET_STATEMENTS,
+        settings.QUERY_BUDGET_SECONDS,
+        settings.QUERY_REPEAT_LIMIT,
+    )
+    if problems:
+        logger.warning(
+            'Query budget exceeded on %s: %s',
+            route,
+            '; '.join(problems),
+            extra={
+                'route': route,
+                'statements': len(log.statements),
+                'db_seconds': log.seconds,
+                'problems': problems,
+            },
+        )
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(
+    max_statements: int | None = None,
+    max_seconds: float | None = None,
+    repeat_limit: int | None = None,
+):
+    """Fail when the block runs more SQL than allowed, on any engine.
+
+    Counts every statement in the block, whatever thread or request runs
+    it, and yields the ``QueryLog`` for finer assertions.
+    """
+    log = QueryLog()
+
+    # The start time goes on the statement's own context: statements of
+    # other connections may run in between
+    def before(conn, cursor, statement, parameters, context, executemany):  # noqa: PLR0913, PLR0917
+        if context is not None:
+            context.madr_budget_started = perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):  # noqa: PLR0913, PLR0917
+        started = getattr(context, 'madr_budget_started', None)
+        if started is not None:
+            log.record(statement, perf_counter() - started)
+
+    # A statement that fails ran too, and never reaches after
+    def failed(exception_context):
+        context = exception_context.execution_context
+        started = getattr(context, 'madr_budget_started', None)
+        if started is not None:
+            del context.madr_budget_started
+            log.record(exception_context.statement, perf_counter() - started)
+
+    event.listen(Engine, 'before_cursor_execute', before)
+    event.listen(Engine, 'after_cursor_execute', after)
+    event.listen(Engine, 'handle_error', failed)
+    try:
+        yield log
+    finally:
+        event.remove(Engine, 'before_cursor_execute', before)
+        event.remove(Engine, 'after_cursor_execute', after)
+        event.remove(Engine, 'handle_error', failed)
+
+    if problems := log.problems(max_statements, max_seconds, repeat_limit):
+        raise QueryBudgetExceeded('; '.join(problems))
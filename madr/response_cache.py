@@ -0,0 +1,138 @@
+import json
+from secrets import token_hex
+from typing import NamedTuple, Protocol
+
+from fastapi import Request, Response
+
+from madr.cache import TTLCache
+from madr.database import wants_primary
+from madr.etag import not_modified
+from madr.serialization import PydanticJSONResponse
+from madr.settings import Settings
+
+settings = Settings()
+
+
+# Responses that embed books in authors or authors in books: writes to
+# either side invalidate all of them
+EXPANDED_NAMESPACES = ('books+author', 'authors+books', 'author+books')
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    headers: tuple[tuple[str, str], ...] = ()
+
+
+class CacheBackend(Protocol):
+    """Storage behind ``ResponseCache``.
+
+    ``TTLCache`` keeps entries in this process. A shared store (Redis,
+    memcached) only has to provide the same methods to let every worker
+    see the others' entries and invalidations.
+    """
+
+    maxsize: int
+
+    def get(self, key: str, default=None): ...
+
+    def set(self, key: str, value): ...
+
+    def clear(self): ...
+
+    def __len__(self) -> int: ...
+
+
+class ResponseCache:
+    """Serialized GET responses, grouped in invalidatable namespaces.
+
+    Each namespace has a random generation token that is part of every
+    key. Invalidating a namespace replaces its token, which orphans all
+    its entries at once; they are then evicted as the LRU fills up.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def _generation(self, namespace: str) -> str:
+        key = f'{namespace}:generation'
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = token_hex(8)
+            self.backend.set(key, generation)
+        return generation
+
+    def key(self, namespace: str, **params) -> str:
+        params = json.dumps(params, sort_keys=True, default=str)
+        return f'{namespace}:{self._generation(namespace)}:{params}'
+
+    def get(self, key: str) -> CachedResponse | None:
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def set(  # noqa
+        self,
+        key: str,
+        body: bytes,
+        etag: str,
+        headers: dict | None = None,
+        *,
+        store: bool = True,
+    ) -> CachedResponse:
+        """The entry for this response, kept under ``key`` if ``store``."""
+        entry = CachedResponse(body, etag, tuple((headers or {}).items()))
+        if store:
+            self.backend.set(key, entry)
+        return entry
+
+    def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            self.backend.set(f'{namespace}:generation', token_hex(8))
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.backend),
+            'maxsize': self.backend.maxsize,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def may_read(request: Request) -> bool:
+    """False for clients sent to the primary: they must see their writes,
+    not an entry stored from a lagging replica before them."""
+    return not wants_primary(request)
+
+
+def may_store(request: Request, session) -> bool:
+    """Whether a response read through ``session`` may be cached.
+
+    Not one read from a replica: stored under the current generation, it
+    would outlive the replica catching up by the whole TTL.
+    """
+    return may_read(request) and not session.info.get('replica')
+
+
+def cached_response(request: Request, entry: CachedResponse) -> Response:
+    """Send ``entry`` as is, or a 304 if the client already has it."""
+    return not_modified(request, entry.etag) or PydanticJSONResponse(
+        entry.body, headers={'ETag': entry.etag, **dict(entry.headers)}
+    )
+
+
+response_cache = ResponseCache(
+    TTLCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL)
+)
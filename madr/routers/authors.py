@@ -1,140 +1,399 @@
-import re
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 from fastapi.exceptions import HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import selectinload
 
-from madr.database import get_session
-from madr.models import Author, User
+from madr.database import (
+    get_read_session,
+    get_session,
+    get_session_factory,
+)
+from madr.etag import (
+    collection_etag,
+    entity_etag,
+    if_match_criteria,
+    not_modified,
+)
+from madr.export import FORMATS as EXPORT_FORMATS
+from madr.export import export_response
+from madr.models import Author, Book
+from madr.normalization import clean, normalize
+from madr.ownership import refusal, writable_by
+from madr.pagination import (
+    COUNT_MODES,
+    fetch_by_ids,
+    next_cursor,
+    page_total,
+    paginate,
+    total_count,
+    total_headers,
+)
+from madr.response_cache import (
+    EXPANDED_NAMESPACES,
+    cached_response,
+    may_read,
+    may_store,
+    response_cache,
+)
 from madr.schemas import (
+    AuthorBatch,
     AuthorList,
     AuthorPublic,
     AuthorSchema,
     AuthorUpdate,
+    AuthorWithBooks,
+    AuthorWithBooksList,
     Message,
 )
-from madr.security import get_current_user
+from madr.security import CurrentUser, get_current_reader, get_current_user
+from madr.serialization import ListSerializer, PydanticJSONResponse
 
 router = APIRouter(prefix='/authors', tags=['authors'])
-T_Session = Annotated[Session, Depends(get_session)]
-T_CurrentUser = Annotated[User, Depends(get_current_user)]
+T_Session = Annotated[AsyncSession, Depends(get_session)]
+T_ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
+T_SessionFactory = Annotated[async_sessionmaker, Depends(get_session_factory)]
+T_CurrentUser = Annotated[CurrentUser, Depends(get_current_user)]
+T_CurrentReader = Annotated[CurrentUser, Depends(get_current_reader)]
+author_list = ListSerializer(AuthorList, 'authors')
+author_with_books_list = ListSerializer(AuthorWithBooksList, 'authors')
+author_batch = ListSerializer(AuthorBatch, 'authors')
 
+author_not_found = HTTPException(
+    status_code=HTTPStatus.NOT_FOUND, detail='Author not found'
+)
+author_already_exists = HTTPException(
+    status_code=HTTPStatus.BAD_REQUEST,
+    detail='Author with the same name already exists',
+)
+
+
+async def upsert_authors(
+    session: AsyncSession, authors: list[AuthorSchema], user_id: int
+) -> list[Author]:
+    """Insert the missing authors and return every one of them, in order.
+
+    A single INSERT ... ON CONFLICT DO UPDATE: the no-op update is what
+    makes RETURNING include the authors that already existed.
+    """
+    names = {}
+    for author in authors:
+        name = clean(author.name)
+        names.setdefault(normalize(name), name)
+    if not names:
+        return []
+
+    statement = insert(Author).values([
+        {'name': name, 'name_normalized': key, 'managed_by_user': user_id}
+        for key, name in names.items()
+    ])
+    db_authors = await session.scalars(
+        statement.on_conflict_do_update(
+            index_elements=[Author.name_normalized],
+            set_={'name_normalized': statement.excluded.name_normalized},
+        ).returning(Author),
+        execution_options={'populate_existing': True},
+    )
+    by_name = {
+        db_author.name_normalized: db_author for db_author in db_authors
+    }
 
-def sanitize_string(value: str) -> str:
-    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', '', value)).strip().lower()
+    return [by_name[key] for key in names]
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=AuthorPublic)
-def create_author(
+async def create_author(
     user: T_CurrentUser,
     author: AuthorSchema,
     session: T_Session,
 ):
-    sanitized_name = sanitize_string(author.name)
-    existing_author = session.scalar(
-        select(Author).where(Author.name == sanitized_name)
-    )
-    if existing_author:
-        raise HTTPException(
-            status_code=HTTPStatus.BAD_REQUEST,
-            detail='Author with the same name already exists',
+    name = clean(author.name)
+    db_author = await session.scalar(
+        insert(Author)
+        .values(
+            name=name, name_normalized=normalize(name), managed_by_user=user.id
         )
+        .on_conflict_do_nothing(index_elements=[Author.name_normalized])
+        .returning(Author)
+    )
+    if not db_author:
+        raise author_already_exists
 
-    db_author = Author(name=sanitized_name, managed_by_user=user.id)
-    session.add(db_author)
-    session.commit()
-    session.refresh(db_author)
+    await session.commit()
+    response_cache.invalidate('authors', *EXPANDED_NAMESPACES)
 
     return db_author
 
 
-@router.get('/', response_model=AuthorList)
-def list_authors(
+@router.put('/', status_code=HTTPStatus.OK, response_model=AuthorPublic)
+async def upsert_author(
+    user: T_CurrentUser,
+    author: AuthorSchema,
     session: T_Session,
+):
+    db_authors = await upsert_authors(session, [author], user.id)
+    await session.commit()
+    response_cache.invalidate('authors', *EXPANDED_NAMESPACES)
+
+    return db_authors[0]
+
+
+@router.put('/batch', status_code=HTTPStatus.OK, response_model=AuthorList)
+async def upsert_author_batch(
     user: T_CurrentUser,
+    authors: list[AuthorSchema],
+    session: T_Session,
+):
+    db_authors = await upsert_authors(session, authors, user.id)
+    await session.commit()
+    response_cache.invalidate('authors', *EXPANDED_NAMESPACES)
+
+    return {'authors': db_authors}
+
+
+def filter_authors(query, name, match):
+    """Apply the list filters shared by ``list_authors`` and the export."""
+    if name:
+        normalized = normalize(name)
+        if match == 'similar':
+            query = query.where(
+                Author.name_normalized.bool_op('%')(normalized)
+            ).order_by(
+                func.similarity(Author.name_normalized, normalized).desc()
+            )
+        else:
+            query = query.where(
+                Author.name_normalized.contains(normalized, autoescape=True)
+            )
+
+    return query
+
+
+@router.get('/', response_model=AuthorList | AuthorWithBooksList | AuthorBatch)
+async def list_authors(  # noqa
+    request: Request,
+    session: T_ReadSession,
+    user: T_CurrentReader,
     name: str = Query(None),
     offset: int = Query(None),
     limit: int = Query(None),
+    cursor: str = Query(None),
+    match: Literal['contains', 'similar'] = Query('contains'),
+    count: Literal[COUNT_MODES] = Query('none'),
+    expand: Literal['books'] = Query(None),
+    ids: list[int] = Query(None),
 ):
-    query = session.query(Author)
-    if name:
-        sanitized_name = sanitize_string(name)
-        query = query.filter(Author.name.contains(sanitized_name))
+    # Fetching known ids replaces the search: the other filters and the
+    # paging do not apply
+    if ids:
+        authors, missing = await fetch_by_ids(
+            session, select(*author_list.columns(Author)), Author.id, ids
+        )
+        return PydanticJSONResponse(
+            author_batch.dump(authors, missing=missing)
+        )
 
-    authors = session.scalars(query.offset(offset).limit(limit)).all()
+    ranked = bool(name) and match == 'similar'
+    if ranked and cursor:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail='Cursor pagination is not available for similarity search',
+        )
 
-    return {'authors': authors}
+    params = {
+        'name': normalize(name) if name else None,
+        'offset': offset,
+        'limit': limit,
+        'cursor': cursor,
+        'match': match,
+        'count': count,
+    }
+    # The key is taken before reading: a write committed meanwhile moves
+    # the generation, so this response is stored where nobody looks
+    key = response_cache.key(
+        'authors+books' if expand else 'authors', **params
+    )
+    if may_read(request) and (entry := response_cache.get(key)):
+        return cached_response(request, entry)
+
+    if expand:
+        query = filter_authors(select(Author), name, match)
+    else:
+        query = filter_authors(
+            select(*author_list.columns(Author)), name, match
+        )
+    page = paginate(query, [Author.id], cursor, offset, limit)
+    if expand:
+        authors = (
+            await session.scalars(
+                page.options(selectinload(Author.books)),
+                execution_options={'populate_existing': True},
+            )
+        ).all()
+        versions = [
+            (
+                author.id,
+                author.updated_at,
+                [(book.id, book.updated_at) for book in author.books],
+            )
+            for author in authors
+        ]
+        serializer = author_with_books_list
+    else:
+        authors = (await session.execute(page)).all()
+        versions = [(author.id, author.updated_at) for author in authors]
+        serializer = author_list
+    total = await total_count(
+        session, query, count, page_total(authors, offset, limit, cursor)
+    )
+    etag = collection_etag(versions, total, expand, sorted(params.items()))
+    if cached := not_modified(request, etag):
+        return cached
+
+    body = serializer.dump(
+        authors,
+        None if ranked else next_cursor(authors, ['id'], limit),
+        entities=bool(expand),
+    )
+
+    return cached_response(
+        request,
+        response_cache.set(
+            key,
+            body,
+            etag,
+            total_headers(total, count),
+            store=may_store(request, session),
+        ),
+    )
+
+
+@router.get('/export')
+async def export_authors(
+    session_factory: T_SessionFactory,
+    user: T_CurrentReader,
+    name: str = Query(None),
+    match: Literal['contains', 'similar'] = Query('contains'),
+    fmt: Literal[EXPORT_FORMATS] = Query('ndjson', alias='format'),
+):
+    query = select(
+        Author.id, Author.name, Author.created_at, Author.updated_at
+    )
+    query = filter_authors(query, name, match).order_by(Author.id)
+
+    return export_response(session_factory, query, fmt, 'authors')
 
 
 @router.get(
-    '/{author_id}', response_model=AuthorPublic, status_code=HTTPStatus.OK
+    '/{author_id}',
+    response_model=AuthorPublic | AuthorWithBooks,
+    status_code=HTTPStatus.OK,
 )
-def get_author_by_id(author_id: int, session: T_Session, user: T_CurrentUser):
-    db_author = session.scalar(
-        select(Author).where(
-            Author.id == author_id,
-        )
+async def get_author_by_id(
+    author_id: int,
+    request: Request,
+    session: T_ReadSession,
+    user: T_CurrentReader,
+    expand: Literal['books'] = Query(None),
+):
+    if expand:
+        key = response_cache.key('author+books', id=author_id)
+    else:
+        key = response_cache.key(f'author:{author_id}')
+    if may_read(request) and (entry := response_cache.get(key)):
+        return cached_response(request, entry)
+
+    query = select(Author).where(Author.id == author_id)
+    if expand:
+        query = query.options(selectinload(Author.books))
+    db_author = await session.scalar(
+        query, execution_options={'populate_existing': True}
     )
 
     if not db_author:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND, detail='Author not found'
+        raise author_not_found
+
+    if expand:
+        etag = collection_etag(
+            [
+                (row.id, row.updated_at)
+                for row in [db_author, *db_author.books]
+            ],
+            expand,
         )
+    else:
+        etag = entity_etag(db_author.id, db_author.updated_at)
+    if cached := not_modified(request, etag):
+        return cached
+    schema = AuthorWithBooks if expand else AuthorPublic
+    body = schema.model_validate(
+        db_author, from_attributes=True
+    ).model_dump_json()
 
-    return db_author
+    return cached_response(
+        request,
+        response_cache.set(
+            key, body.encode(), etag, store=may_store(request, session)
+        ),
+    )
 
 
 @router.patch(
     '/{author_id}', status_code=HTTPStatus.OK, response_model=AuthorPublic
 )
-def update_author(
+async def update_author(  # noqa
     author_id: int,
+    request: Request,
+    response: Response,
     user: T_CurrentUser,
     session: T_Session,
     author: AuthorUpdate,
 ):
-    db_author = session.scalar(
-        select(Author).where(
-            Author.id == author_id,
-        )
-    )
-
-    if not db_author:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND, detail='Author not found'
-        )
+    values = author.model_dump(exclude_unset=True)
+    if 'name' in values:
+        values['name'] = clean(values['name'])
+        values['name_normalized'] = normalize(values['name'])
 
-    if db_author.managed_by_user is None:
-        db_author.managed_by_user = user.id
-    elif db_author.managed_by_user != user.id:
-        raise HTTPException(
-            status_code=HTTPStatus.FORBIDDEN,
-            detail='You do not have permission to modify this author',
-        )
-
-    if 'name' in author.model_dump(exclude_unset=True):
-        sanitized_name = sanitize_string(author.name)
-        existing_author = session.scalar(
-            select(Author).where(
-                Author.name == sanitized_name,
+    try:
+        db_author = await session.scalar(
+            update(Author)
+            .where(
+                Author.id == author_id,
+                writable_by(Author, user.id),
+                *if_match_criteria(request, author_id, Author.updated_at),
             )
-        )
-        if existing_author and existing_author.id != author_id:
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
-                detail='Author with the same name already exists',
+            .values(
+                **values,
+                managed_by_user=func.coalesce(Author.managed_by_user, user.id),
             )
-        setattr(db_author, 'name', sanitized_name)
+            .returning(Author)
+        )
+    except IntegrityError:
+        raise author_already_exists
 
-    for key, value in author.model_dump(exclude_unset=True).items():
-        setattr(db_author, key, value)
+    if not db_author:
+        raise await refusal(
+            session,
+            Author,
+            author_id,
+            user.id,
+            author_not_found,
+            HTTPException(
+                status_code=HTTPStatus.FORBIDDEN,
+                detail='You do not have permission to modify this author',
+            ),
+        )
 
-    session.add(db_author)
-    session.commit()
-    session.refresh(db_author)
+    await session.commit()
+    response_cache.invalidate(
+        'authors', f'author:{author_id}', *EXPANDED_NAMESPACES
+    )
+    response.headers['ETag'] = entity_etag(db_author.id, db_author.updated_at)
 
     return db_author
 
@@ -142,27 +401,45 @@ def update_author(
 @router.delete(
     '/{author_id}', response_model=Message, status_code=HTTPStatus.OK
 )
-def delete_author(author_id: int, session: T_Session, user: T_CurrentUser):
-    db_author = session.scalar(
-        select(Author).where(
+async def delete_author(
+    author_id: int, request: Request, session: T_Session, user: T_CurrentUser
+):
+    deleted = (
+        delete(Author)
+        .where(
             Author.id == author_id,
+            writable_by(Author, user.id),
+            *if_match_criteria(request, author_id, Author.updated_at),
         )
+        .returning(Author.id)
+        .cte('deleted')
+    )
+    # The foreign key sets author_id to NULL behind the ORM's back: touch
+    # the books in the same statement so their updated_at (and the list
+    # ETags) move too
+    touched = (
+        update(Book)
+        .where(Book.author_id.in_(select(deleted.c.id)))
+        .values(author_id=None, updated_at=func.now())
+        .cte('touched')
     )
 
-    if not db_author:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND, detail='Author not found'
-        )
-
-    if db_author.managed_by_user is None:
-        db_author.managed_by_user = user.id
-    elif db_author.managed_by_user != user.id:
-        raise HTTPException(
-            status_code=HTTPStatus.FORBIDDEN,
-            detail='You do not have permission to delete this author',
+    if await session.scalar(select(deleted.c.id).add_cte(touched)) is None:
+        raise await refusal(
+            session,
+            Author,
+            author_id,
+            user.id,
+            author_not_found,
+            HTTPException(
+                status_code=HTTPStatus.FORBIDDEN,
+                detail='You do not have permission to delete this author',
+            ),
         )
 
-    session.delete(db_author)
-    session.commit()
+    await session.commit()
+    response_cache.invalidate(
+        'authors', f'author:{author_id}', 'books', *EXPANDED_NAMESPACES
+    )
 
     return {'message': 'Author deleted'}
@@ -1,166 +1,541 @@
-import re
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 from fastapi.exceptions import HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import Session
-
-from madr.database import get_session
-from madr.models import Author, Book, User
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import joinedload
+
+from madr.database import (
+    get_read_session,
+    get_session,
+    get_session_factory,
+    violated_constraint,
+)
+from madr.etag import (
+    collection_etag,
+    entity_etag,
+    if_match_criteria,
+    not_modified,
+)
+from madr.export import FORMATS as EXPORT_FORMATS
+from madr.export import export_response
+from madr.importer import FORMATS, import_books, read_lines
+from madr.models import Book
+from madr.normalization import clean, normalize
+from madr.ownership import refusal, writable_by
+from madr.pagination import (
+    COUNT_MODES,
+    fetch_by_ids,
+    next_cursor,
+    page_total,
+    paginate,
+    total_count,
+    total_headers,
+)
+from madr.response_cache import (
+    EXPANDED_NAMESPACES,
+    cached_response,
+    may_read,
+    may_store,
+    response_cache,
+)
 from madr.schemas import (
+    BookBatch,
     BookList,
     BookPublic,
     BookSchema,
     BookUpdate,
+    BookWithAuthorList,
+    ImportReport,
     Message,
 )
-from madr.security import get_current_user
+from madr.security import CurrentUser, get_current_reader, get_current_user
+from madr.serialization import ListSerializer, PydanticJSONResponse
 
 router = APIRouter(prefix='/books', tags=['books'])
-T_Session = Annotated[Session, Depends(get_session)]
-T_CurrentUser = Annotated[User, Depends(get_current_user)]
+T_Session = Annotated[AsyncSession, Depends(get_session)]
+T_ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
+T_SessionFactory = Annotated[async_sessionmaker, Depends(get_session_factory)]
+T_CurrentUser = Annotated[CurrentUser, Depends(get_current_user)]
+T_CurrentReader = Annotated[CurrentUser, Depends(get_current_reader)]
+book_list = ListSerializer(BookList, 'books')
+book_with_author_list = ListSerializer(BookWithAuthorList, 'books')
+book_batch = ListSerializer(BookBatch, 'books')
+
+
+book_already_exists = HTTPException(
+    status_code=HTTPStatus.BAD_REQUEST,
+    detail='Book with the same title already exists',
+)
+author_does_not_exist = HTTPException(
+    status_code=HTTPStatus.BAD_REQUEST, detail='Author does not exist'
+)
+book_not_found = HTTPException(
+    status_code=HTTPStatus.NOT_FOUND, detail='Book not found'
+)
+book_forbidden = HTTPException(
+    status_code=HTTPStatus.FORBIDDEN,
+    detail='You do not have permission to modify this book',
+)
+
+
+CONSTRAINT_ERRORS = {
+    'books_title_normalized_key': book_already_exists,
+    'books_author_id_fkey': author_does_not_exist,
+}
+
+
+def integrity_error(error: IntegrityError) -> HTTPException:
+    """The client error for a violated constraint; any other is a bug and
+    is raised again."""
+    if exception := CONSTRAINT_ERRORS.get(violated_constraint(error)):
+        return exception
+    raise error
+
+
+def book_values(books: list[BookSchema], user_id: int) -> list[dict]:
+    values = {}
+    for book in books:
+        if book.author_id is None:
+            raise author_does_not_exist
+        title = clean(book.title)
+        values[normalize(title)] = {
+            'title': title,
+            'title_normalized': normalize(title),
+            'year': book.year,
+            'author_id': book.author_id,
+            'managed_by_user': user_id,
+        }
+
+    return list(values.values())
+
+
+async def upsert_books(
+    session: AsyncSession, books: list[BookSchema], user_id: int
+) -> list[Book]:
+    """Insert or update books by title in one INSERT ... ON CONFLICT.
+
+    Existing books managed by someone else are left alone and reported
+    as 403; repeated titles in the same batch keep the last one.
+    """
+    values = book_values(books, user_id)
+    if not values:
+        return []
+
+    statement = insert(Book).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Book.title_normalized],
+        set_={
+            'title': statement.excluded.title,
+            'year': statement.excluded.year,
+            'author_id': statement.excluded.author_id,
+            'managed_by_user': func.coalesce(
+                Book.managed_by_user, statement.excluded.managed_by_user
+            ),
+            'updated_at': func.now(),
+        },
+        where=(Book.managed_by_user.is_(None))
+        | (Book.managed_by_user == user_id),
+    )
+    try:
+        db_books = (
+            await session.scalars(
+                statement.returning(Book),
+                execution_options={'populate_existing': True},
+            )
+        ).all()
+    except IntegrityError as error:
+        raise integrity_error(error)
 
+    if len(db_books) < len(values):
+        raise book_forbidden
 
-def sanitize_string(value: str) -> str:
-    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', '', value)).strip().lower()
+    by_title = {db_book.title_normalized: db_book for db_book in db_books}
+    return [by_title[value['title_normalized']] for value in values]
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=BookPublic)
-def create_book(
+async def create_book(
     user: T_CurrentUser,
     book: BookSchema,
     session: T_Session,
 ):
-    sanitized_title = sanitize_string(book.title)
-
-    db_author = session.scalar(
-        select(Author).where(Author.id == book.author_id)
-    )
-    if not db_author:
-        raise HTTPException(
-            status_code=HTTPStatus.BAD_REQUEST, detail='Author does not exist'
+    try:
+        db_book = await session.scalar(
+            insert(Book)
+            .values(book_values([book], user.id))
+            .on_conflict_do_nothing(index_elements=[Book.title_normalized])
+            .returning(Book)
         )
+    except IntegrityError as error:
+        raise integrity_error(error)
 
-    existing_book = session.scalar(
-        select(Book).where(
-            Book.title == sanitized_title,
-        )
-    )
-    if existing_book:
-        raise HTTPException(
-            status_code=HTTPStatus.BAD_REQUEST,
-            detail='Book with the same title already exists',
-        )
+    if not db_book:
+        raise book_already_exists
 
-    db_book = Book(
-        title=sanitized_title,
-        year=book.year,
-        managed_by_user=user.id,
-        author_id=book.author_id,
-    )
-    session.add(db_book)
-    session.commit()
-    session.refresh(db_book)
+    await session.commit()
+    response_cache.invalidate('books', *EXPANDED_NAMESPACES)
 
     return db_book
 
 
-@router.get('/', response_model=BookList)
-def list_books(  # noqa
+@router.put('/', status_code=HTTPStatus.OK, response_model=BookPublic)
+async def upsert_book(
+    user: T_CurrentUser,
+    book: BookSchema,
     session: T_Session,
+):
+    db_books = await upsert_books(session, [book], user.id)
+    await session.commit()
+    response_cache.invalidate('books', *EXPANDED_NAMESPACES)
+
+    return db_books[0]
+
+
+@router.put('/batch', status_code=HTTPStatus.OK, response_model=BookList)
+async def upsert_book_batch(
     user: T_CurrentUser,
-    title: str = Query(None),
-    year: int = Query(None),
-    offset: int = Query(None),
-    limit: int = Query(None),
+    books: list[BookSchema],
+    session: T_Session,
 ):
-    query = session.query(Book)
+    db_books = await upsert_books(session, books, user.id)
+    await session.commit()
+    response_cache.invalidate('books', *EXPANDED_NAMESPACES)
 
-    if title:
-        sanitized_title = sanitize_string(title)
-        query = query.filter(Book.title.contains(sanitized_title))
+    return {'books': db_books}
 
-    if year:
-        query = query.filter(Book.year == year)
 
-    books = session.scalars(query.offset(offset).limit(limit)).all()
+@router.post('/import', status_code=HTTPStatus.OK, response_model=ImportReport)
+async def import_catalog(
+    request: Request,
+    user: T_CurrentUser,
+    session: T_Session,
+    fmt: Literal[FORMATS] = Query('csv', alias='format'),
+):
+    report = await import_books(
+        session, read_lines(request.stream()), fmt, user.id
+    )
+    response_cache.invalidate('books', 'authors', *EXPANDED_NAMESPACES)
 
-    return {'books': books}
+    return report
 
 
-@router.patch(
-    '/{book_id}', status_code=HTTPStatus.OK, response_model=BookPublic
-)
-def update_book(
-    book_id: int, user: T_CurrentUser, session: T_Session, book: BookUpdate
+def filter_books(  # noqa
+    query,
+    title,
+    year,
+    match,
+    *,
+    year_min=None,
+    year_max=None,
+    author_id=None,
+    managed_by_user=None,
 ):
-    db_book = session.scalar(select(Book).where(Book.id == book_id))
+    """Apply the list filters shared by ``list_books`` and the export."""
+    if title:
+        normalized = normalize(title)
+        if match == 'similar':
+            query = query.where(
+                Book.title_normalized.bool_op('%')(normalized)
+            ).order_by(
+                func.similarity(Book.title_normalized, normalized).desc()
+            )
+        else:
+            query = query.where(
+                Book.title_normalized.contains(normalized, autoescape=True)
+            )
 
-    if not db_book:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND, detail='Book not found'
+    if year:
+        query = query.where(Book.year == year)
+    if year_min is not None:
+        query = query.where(Book.year >= year_min)
+    if year_max is not None:
+        query = query.where(Book.year <= year_max)
+    if author_id is not None:
+        query = query.where(Book.author_id == author_id)
+    if managed_by_user is not None:
+        query = query.where(Book.managed_by_user == managed_by_user)
+
+    return query
+
+
+# Each sort walks an index: (year, id) for year, and for title the unique
+# one on title_normalized, where the id tiebreaker never decides
+SORTS = {'id': Book.id, 'year': Book.year, 'title': Book.title_normalized}
+SORT_PARAMS = tuple(f'{sign}{name}' for name in SORTS for sign in ('', '-'))
+
+
+@router.get('/', response_model=BookList | BookWithAuthorList | BookBatch)
+async def list_books(  # noqa
+    request: Request,
+    session: T_ReadSession,
+    user: T_CurrentReader,
+    title: str = Query(None),
+    year: int = Query(None),
+    offset: int = Query(None),
+    limit: int = Query(None),
+    cursor: str = Query(None),
+    match: Literal['contains', 'similar'] = Query('contains'),
+    count: Literal[COUNT_MODES] = Query('none'),
+    expand: Literal['author'] = Query(None),
+    ids: list[int] = Query(None),
+    year_min: int = Query(None),
+    year_max: int = Query(None),
+    author_id: int = Query(None),
+    managed_by_user: int = Query(None),
+    sort: Literal[SORT_PARAMS] = Query('id'),
+):
+    # Fetching known ids replaces the search: the other filters and the
+    # paging do not apply
+    if ids:
+        books, missing = await fetch_by_ids(
+            session, select(*book_list.columns(Book)), Book.id, ids
         )
+        return PydanticJSONResponse(book_batch.dump(books, missing=missing))
 
-    if db_book.managed_by_user is None:
-        db_book.managed_by_user = user.id
-    elif db_book.managed_by_user != user.id:
+    ranked = bool(title) and match == 'similar'
+    if ranked and cursor:
         raise HTTPException(
-            status_code=HTTPStatus.FORBIDDEN,
-            detail='You do not have permission to modify this book',
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail='Cursor pagination is not available for similarity search',
         )
 
-    if 'title' in book.model_dump(exclude_unset=True):
-        sanitized_title = sanitize_string(book.title)
-        existing_book = session.scalar(
-            select(Book).where(Book.title == sanitized_title)
+    params = {
+        'title': normalize(title) if title else None,
+        'year': year,
+        'offset': offset,
+        'limit': limit,
+        'cursor': cursor,
+        'match': match,
+        'count': count,
+        'year_min': year_min,
+        'year_max': year_max,
+        'author_id': author_id,
+        'managed_by_user': managed_by_user,
+        'sort': sort,
+    }
+    # The key is taken before reading: a write committed meanwhile moves
+    # the generation, so this response is stored where nobody looks
+    key = response_cache.key('books+author' if expand else 'books', **params)
+    if may_read(request) and (entry := response_cache.get(key)):
+        return cached_response(request, entry)
+
+    filters = {
+        'year_min': year_min,
+        'year_max': year_max,
+        'author_id': author_id,
+        'managed_by_user': managed_by_user,
+    }
+    sort_column = SORTS[sort.removeprefix('-')]
+    keys = [Book.id] if sort_column is Book.id else [sort_column, Book.id]
+    if expand:
+        query = filter_books(select(Book), title, year, match, **filters)
+    else:
+        # The sort key goes into the row for the next cursor; the
+        # serializer ignores columns past the schema fields
+        query = filter_books(
+            select(*book_list.columns(Book), *keys[:-1]),
+            title,
+            year,
+            match,
+            **filters,
         )
-        if existing_book and existing_book.id != book_id:
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
-                detail='Book with the same title already exists',
+    page = paginate(
+        query, keys, cursor, offset, limit, descending=sort.startswith('-')
+    )
+    if expand:
+        books = (
+            await session.scalars(
+                page.options(joinedload(Book.author)),
+                execution_options={'populate_existing': True},
             )
-        setattr(db_book, 'title', sanitized_title)
+        ).all()
+        versions = [
+            (book.id, book.updated_at, book.author and book.author.updated_at)
+            for book in books
+        ]
+        serializer = book_with_author_list
+    else:
+        books = (await session.execute(page)).all()
+        versions = [(book.id, book.updated_at) for book in books]
+        serializer = book_list
+    total = await total_count(
+        session, query, count, page_total(books, offset, limit, cursor)
+    )
+    etag = collection_etag(versions, total, expand, sorted(params.items()))
+    if cached := not_modified(request, etag):
+        return cached
+
+    body = serializer.dump(
+        books,
+        None
+        if ranked
+        else next_cursor(books, [key.key for key in keys], limit),
+        entities=bool(expand),
+    )
+
+    return cached_response(
+        request,
+        response_cache.set(
+            key,
+            body,
+            etag,
+            total_headers(total, count),
+            store=may_store(request, session),
+        ),
+    )
 
-    if 'author_id' in book.model_dump(exclude_unset=True):
-        db_author = session.scalar(
-            select(Author).where(Author.id == book.author_id)
+
+@router.get('/export')
+async def export_books(  # noqa
+    session_factory: T_SessionFactory,
+    user: T_CurrentReader,
+    title: str = Query(None),
+    year: int = Query(None),
+    match: Literal['contains', 'similar'] = Query('contains'),
+    fmt: Literal[EXPORT_FORMATS] = Query('ndjson', alias='format'),
+    year_min: int = Query(None),
+    year_max: int = Query(None),
+    author_id: int = Query(None),
+    managed_by_user: int = Query(None),
+):
+    query = select(
+        Book.id,
+        Book.title,
+        Book.year,
+        Book.author_id,
+        Book.created_at,
+        Book.updated_at,
+    )
+    query = filter_books(
+        query,
+        title,
+        year,
+        match,
+        year_min=year_min,
+        year_max=year_max,
+        author_id=author_id,
+        managed_by_user=managed_by_user,
+    ).order_by(Book.id)
+
+    return export_response(session_factory, query, fmt, 'books')
+
+
+@router.get('/{book_id}', status_code=HTTPStatus.OK, response_model=BookPublic)
+async def get_book_by_id(
+    book_id: int,
+    request: Request,
+    session: T_ReadSession,
+    user: T_CurrentReader,
+):
+    # Under 'books': every book write already invalidates it
+    key = response_cache.key('books', id=book_id)
+    if may_read(request) and (entry := response_cache.get(key)):
+        return cached_response(request, entry)
+
+    db_book = (
+        await session.execute(
+            select(*book_list.columns(Book)).where(Book.id == book_id)
         )
-        if not db_author:
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
-                detail='Author does not exist',
+    ).first()
+    if not db_book:
+        raise book_not_found
+
+    etag = entity_etag(db_book.id, db_book.updated_at)
+    if cached := not_modified(request, etag):
+        return cached
+    body = BookPublic.model_validate(db_book, from_attributes=True)
+
+    return cached_response(
+        request,
+        response_cache.set(
+            key,
+            body.model_dump_json().encode(),
+            etag,
+            store=may_store(request, session),
+        ),
+    )
+
+
+@router.patch(
+    '/{book_id}', status_code=HTTPStatus.OK, response_model=BookPublic
+)
+async def update_book(  # noqa
+    book_id: int,
+    request: Request,
+    response: Response,
+    user: T_CurrentUser,
+    session: T_Session,
+    book: BookUpdate,
+):
+    values = book.model_dump(exclude_unset=True)
+    if 'title' in values:
+        values['title'] = clean(values['title'])
+        values['title_normalized'] = normalize(values['title'])
+    if 'author_id' in values and values['author_id'] is None:
+        raise author_does_not_exist
+
+    try:
+        db_book = await session.scalar(
+            update(Book)
+            .where(
+                Book.id == book_id,
+                writable_by(Book, user.id),
+                *if_match_criteria(request, book_id, Book.updated_at),
             )
+            .values(
+                **values,
+                managed_by_user=func.coalesce(Book.managed_by_user, user.id),
+            )
+            .returning(Book)
+        )
+    except IntegrityError as error:
+        raise integrity_error(error)
 
-    for key, value in book.model_dump(exclude_unset=True).items():
-        setattr(db_book, key, value)
+    if not db_book:
+        raise await refusal(
+            session, Book, book_id, user.id, book_not_found, book_forbidden
+        )
 
-    session.add(db_book)
-    session.commit()
-    session.refresh(db_book)
+    await session.commit()
+    response_cache.invalidate('books', *EXPANDED_NAMESPACES)
+    response.headers['ETag'] = entity_etag(db_book.id, db_book.updated_at)
 
     return db_book
 
 
 @router.delete('/{book_id}', response_model=Message, status_code=HTTPStatus.OK)
-def delete_book(book_id: int, session: T_Session, user: T_CurrentUser):
-    db_book = session.scalar(select(Book).where(Book.id == book_id))
-
-    if not db_book:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND, detail='Book not found'
+async def delete_book(
+    book_id: int, request: Request, session: T_Session, user: T_CurrentUser
+):
+    deleted = await session.scalar(
+        delete(Book)
+        .where(
+            Book.id == book_id,
+            writable_by(Book, user.id),
+            *if_match_criteria(request, book_id, Book.updated_at),
         )
+        .returning(Book.id)
+    )
 
-    if db_book.managed_by_user is None:
-        db_book.managed_by_user = user.id
-    elif db_book.managed_by_user != user.id:
-        raise HTTPException(
-            status_code=HTTPStatus.FORBIDDEN,
-            detail='You do not have permission to delete this book',
+    if deleted is None:
+        raise await refusal(
+            session,
+            Book,
+            book_id,
+            user.id,
+            book_not_found,
+            HTTPException(
+                status_code=HTTPStatus.FORBIDDEN,
+                detail='You do not have permission to delete this book',
+            ),
         )
 
-    session.delete(db_book)
-    session.commit()
+    await session.commit()
+    response_cache.invalidate('books', *EXPANDED_NAMESPACES)
 
     return {'message': 'Book deleted'}
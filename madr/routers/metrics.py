@@ -0,0 +1,76 @@
+from http import HTTPStatus
+
+from anyio.to_thread import current_default_thread_limiter
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from madr.database import pool_status
+from madr.metrics import Counter, Gauge, registry
+from madr.security import hashing_pool
+
+router = APIRouter(tags=['metrics'])
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _pool(field: str):
+    return lambda: pool_status()[field]
+
+
+# Read when rendered from what the pool and the executors already track
+snapshot = [
+    Gauge(
+        'madr_db_pool_size',
+        'Connections the pool keeps open.',
+        callback=_pool('size'),
+    ),
+    Gauge(
+        'madr_db_pool_checked_out',
+        'Connections in use.',
+        callback=_pool('checked_out'),
+    ),
+    Gauge(
+        'madr_db_pool_overflow',
+        'Connections open beyond the pool size.',
+        callback=_pool('overflow'),
+    ),
+    Counter(
+        'madr_db_pool_timeouts_total',
+        'Checkouts that gave up waiting for a connection.',
+        callback=_pool('timeouts'),
+    ),
+    Gauge(
+        'madr_threadpool_busy_threads',
+        'Threads running sync endpoints and dependencies.',
+        callback=lambda: current_default_thread_limiter().borrowed_tokens,
+    ),
+    Gauge(
+        'madr_threadpool_max_threads',
+        'Size of the thread pool for sync endpoints and dependencies.',
+        callback=lambda: current_default_thread_limiter().total_tokens,
+    ),
+    Gauge(
+        'madr_password_hash_pending',
+        'Argon2 tasks running or queued in the hashing pool.',
+        callback=lambda: hashing_pool.pending,
+    ),
+    Gauge(
+        'madr_password_hash_capacity',
+        'Argon2 tasks the hashing pool accepts before answering 503.',
+        callback=lambda: hashing_pool.capacity,
+    ),
+    Counter(
+        'madr_password_hash_rejected_total',
+        'Logins and sign-ups refused because the hashing pool was full.',
+        callback=lambda: hashing_pool.rejected,
+    ),
+]
+
+
+@router.get(
+    '/metrics', status_code=HTTPStatus.OK, response_class=PlainTextResponse
+)
+async def read_metrics():
+    return PlainTextResponse(
+        registry.render(*snapshot), media_type=CONTENT_TYPE
+    )
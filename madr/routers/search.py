@@ -0,0 +1,59 @@
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import REAL, and_, cast, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from madr.database import get_read_session
+from madr.models import Author, Book
+from madr.pagination import decode_cursor, next_cursor
+from madr.schemas import SearchResults
+from madr.security import CurrentUser, get_current_reader
+
+router = APIRouter(prefix='/search', tags=['search'])
+T_ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
+T_CurrentReader = Annotated[CurrentUser, Depends(get_current_reader)]
+
+
+@router.get('/', status_code=HTTPStatus.OK, response_model=SearchResults)
+async def search(
+    session: T_ReadSession,
+    user: T_CurrentReader,
+    q: str = Query(min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str = Query(None),
+):
+    ts_query = func.websearch_to_tsquery('simple', q)
+    rank = func.ts_rank(Book.search_vector, ts_query, type_=REAL)
+
+    query = (
+        select(
+            Book.id,
+            Book.title,
+            Book.year,
+            Book.author_id,
+            Author.name.label('author_name'),
+            rank.label('rank'),
+        )
+        .outerjoin(Author, Author.id == Book.author_id)
+        .where(Book.search_vector.bool_op('@@')(ts_query))
+        .order_by(rank.desc(), Book.id)
+        .limit(limit)
+    )
+
+    if cursor:
+        last_rank, last_id = decode_cursor(cursor, [rank, Book.id])
+        # ts_rank is a real: compared to a double, the rank read back from
+        # the cursor is never equal to itself
+        last_rank = cast(last_rank, REAL)
+        query = query.where(
+            or_(rank < last_rank, and_(rank == last_rank, Book.id > last_id))
+        )
+
+    results = (await session.execute(query)).all()
+
+    return {
+        'results': results,
+        'next_cursor': next_cursor(results, ['rank', 'id'], limit),
+    }
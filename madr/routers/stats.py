@@ -0,0 +1,23 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter
+
+from madr.database import pool_status
+from madr.response_cache import response_cache
+from madr.schemas import CacheStatus, PoolStatus
+from madr.security import user_cache
+
+router = APIRouter(prefix='/stats', tags=['stats'])
+
+
+@router.get('/pool', status_code=HTTPStatus.OK, response_model=PoolStatus)
+async def read_pool_status():
+    return pool_status()
+
+
+@router.get('/cache', status_code=HTTPStatus.OK, response_model=CacheStatus)
+async def read_cache_status():
+    return {
+        'user': user_cache.stats(),
+        'response': response_cache.stats(),
+    }
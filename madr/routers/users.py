@@ -1,41 +1,88 @@
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from madr.database import get_session
+from madr.database import get_read_session, get_session
 from madr.models import User
-from madr.schemas import Message, UserList, UserPublic, UserSchema
+from madr.pagination import (
+    COUNT_MODES,
+    fetch_by_ids,
+    next_cursor,
+    page_total,
+    paginate,
+    total_count,
+    total_headers,
+)
+from madr.response_cache import EXPANDED_NAMESPACES, response_cache
+from madr.schemas import (
+    Message,
+    Token,
+    UserBatch,
+    UserList,
+    UserPublic,
+    UserSchema,
+    UserUpdated,
+)
 from madr.security import (
+    CurrentUser,
+    create_access_token,
+    get_current_reader,
     get_current_user,
-    get_password_hash,
+    hash_password,
+    settings,
+    token_claims,
+    token_versions,
+    user_cache,
+    verify_and_update_password,
 )
+from madr.serialization import ListSerializer, PydanticJSONResponse
 
 router = APIRouter(prefix='/users', tags=['users'])
-T_Session = Annotated[Session, Depends(get_session)]
-T_CurrentUser = Annotated[User, Depends(get_current_user)]
-
-
-@router.get('/', response_model=UserList)
-def read_users(
-    session: T_Session,
-    current_user: T_CurrentUser,
+T_Session = Annotated[AsyncSession, Depends(get_session)]
+T_ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
+T_CurrentUser = Annotated[CurrentUser, Depends(get_current_user)]
+T_CurrentReader = Annotated[CurrentUser, Depends(get_current_reader)]
+user_list = ListSerializer(UserList, 'users')
+user_batch = ListSerializer(UserBatch, 'users')
+
+
+@router.get('/', response_model=UserList | UserBatch)
+async def read_users(  # noqa
+    session: T_ReadSession,
+    current_user: T_CurrentReader,
     skip: int = 0,
     limit: int = 100,
+    cursor: str = Query(None),
+    count: Literal[COUNT_MODES] = Query('none'),
+    ids: list[int] = Query(None),
 ):
-    users = session.scalars(select(User).offset(skip).limit(limit)).all()
-    return {'users': users}
+    query = select(*user_list.columns(User))
+    if ids:
+        users, missing = await fetch_by_ids(session, query, User.id, ids)
+        return PydanticJSONResponse(user_batch.dump(users, missing=missing))
+
+    users = (
+        await session.execute(paginate(query, [User.id], cursor, skip, limit))
+    ).all()
+    total = await total_count(
+        session, query, count, page_total(users, skip, limit, cursor)
+    )
+    return PydanticJSONResponse(
+        user_list.dump(users, next_cursor(users, ['id'], limit)),
+        headers=total_headers(total, count),
+    )
 
 
 @router.get('/{user_id}', status_code=HTTPStatus.OK, response_model=UserPublic)
-def get_user(
+async def get_user(
     user_id: int,
-    session: T_Session,
-    current_user: T_CurrentUser,
+    session: T_ReadSession,
+    current_user: T_CurrentReader,
 ):
-    db_user = session.scalar(select(User).where(User.id == user_id))
+    db_user = await session.scalar(select(User).where(User.id == user_id))
     if not db_user:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='User not found'
@@ -44,8 +91,8 @@ def get_user(
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=UserPublic)
-def create_user(user: UserSchema, session: T_Session):
-    db_user = session.scalar(
+async def create_user(user: UserSchema, session: T_Session):
+    db_user = await session.scalar(
         select(User).where(
             (User.username == user.username) | (User.email == user.email)
         )
@@ -64,18 +111,23 @@ def create_user(user: UserSchema, session: T_Session):
 
     db_user = User(
         username=user.username,
-        password=get_password_hash(user.password),
+        password=await hash_password(user.password),
         email=user.email,
     )
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await session.commit()
+    await session.refresh(db_user)
 
     return db_user
 
 
-@router.put('/{user_id}', status_code=HTTPStatus.OK, response_model=UserPublic)
-def update_user(
+@router.put(
+    '/{user_id}',
+    status_code=HTTPStatus.OK,
+    response_model=UserUpdated,
+    response_model_exclude_none=True,
+)
+async def update_user(
     user_id: int,
     user: UserSchema,
     session: T_Session,
@@ -86,17 +138,46 @@ def update_user(
             status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions'
         )
 
-    current_user.username = user.username
-    current_user.password = get_password_hash(user.password)
-    current_user.email = user.email
-    session.commit()
-    session.refresh(current_user)
+    db_user = await session.get(User, user_id)
+    if not db_user:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail='User not found'
+        )
+
+    same_password, _ = await verify_and_update_password(
+        user.password, db_user.password
+    )
+    # Tokens issued with the old password or email stop working; with
+    # STATELESS_AUTH so do those claiming the old username
+    revoke = (
+        not same_password
+        or user.email != db_user.email
+        or (settings.STATELESS_AUTH and user.username != db_user.username)
+    )
+
+    db_user.username = user.username
+    db_user.email = user.email
+    if not same_password:
+        db_user.password = await hash_password(user.password)
+    if revoke:
+        db_user.token_version = User.token_version + 1
+    await session.commit()
+    await session.refresh(db_user)
+    user_cache.pop(current_user.email)
+
+    updated = UserUpdated.model_validate(db_user)
+    if revoke:
+        token_versions.set(db_user.id, db_user.token_version)
+        updated.token = Token(
+            access_token=create_access_token(token_claims(db_user)),
+            token_type='bearer',
+        )
 
-    return current_user
+    return updated
 
 
 @router.delete('/{user_id}', status_code=HTTPStatus.OK, response_model=Message)
-def delete_user(
+async def delete_user(
     user_id: int,
     session: T_Session,
     current_user: T_CurrentUser,
@@ -105,7 +186,19 @@ def delete_user(
         raise HTTPException(
             status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions'
         )
-    session.delete(current_user)
-    session.commit()
+
+    db_user = await session.get(User, user_id)
+    if not db_user:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail='User not found'
+        )
+
+    await session.delete(db_user)
+    await token_versions.record_deletion(session, user_id)
+    await session.commit()
+    user_cache.pop(current_user.email)
+    token_versions.discard(user_id)
+    # Their books and authors are no longer managed by anyone
+    response_cache.invalidate('books', 'authors', *EXPANDED_NAMESPACES)
 
     return {'message': 'User deleted'}
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, field_validator
 
 
 class Message(BaseModel):
@@ -22,6 +22,12 @@ class UserPublic(BaseModel):
 
 class UserList(BaseModel):
     users: list[UserPublic]
+    next_cursor: str | None = None
+
+
+class UserBatch(BaseModel):
+    users: list[UserPublic]
+    missing: list[int]
 
 
 class Token(BaseModel):
@@ -29,6 +35,11 @@ class Token(BaseModel):
     token_type: str
 
 
+class UserUpdated(UserPublic):
+    # Set when the update revoked the caller's tokens: its replacement
+    token: Token | None = None
+
+
 class TokenData(BaseModel):
     username: str | None = None
 
@@ -47,13 +58,32 @@ class BookPublic(BookSchema):
 
 class BookList(BaseModel):
     books: list[BookPublic]
+    next_cursor: str | None = None
+
+
+class BookBatch(BaseModel):
+    books: list[BookPublic]
+    missing: list[int]
+
+
+def _not_null(value):
+    if value is None:
+        raise ValueError('may be omitted but not null')
+    return value
 
 
 class BookUpdate(BaseModel):
+    # Optional, not nullable: only author_id can be cleared, and the
+    # handler refuses that one with its own message
     title: str | None = None
     year: int | None = None
     author_id: int | None = None
 
+    @field_validator('title', 'year')
+    @classmethod
+    def not_null(cls, value):
+        return _not_null(value)
+
 
 class AuthorSchema(BaseModel):
     name: str
@@ -67,7 +97,88 @@ class AuthorPublic(AuthorSchema):
 
 class AuthorList(BaseModel):
     authors: list[AuthorPublic]
+    next_cursor: str | None = None
+
+
+class AuthorBatch(BaseModel):
+    authors: list[AuthorPublic]
+    missing: list[int]
+
+
+class BookWithAuthor(BookPublic):
+    author: AuthorPublic | None
+
+
+class BookWithAuthorList(BaseModel):
+    books: list[BookWithAuthor]
+    next_cursor: str | None = None
+
+
+class AuthorWithBooks(AuthorPublic):
+    books: list[BookPublic]
+
+
+class AuthorWithBooksList(BaseModel):
+    authors: list[AuthorWithBooks]
+    next_cursor: str | None = None
 
 
 class AuthorUpdate(BaseModel):
     name: str | None = None
+
+    @field_validator('name')
+    @classmethod
+    def not_null(cls, value):
+        return _not_null(value)
+
+
+class PoolStatus(BaseModel):
+    pool_class: str
+    size: int | None
+    checked_in: int | None
+    checked_out: int | None
+    overflow: int | None
+    checkouts: int
+    timeouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+
+
+class SearchResult(BaseModel):
+    id: int
+    title: str
+    year: int
+    author_id: int | None
+    author_name: str | None
+    rank: float
+
+
+class SearchResults(BaseModel):
+    results: list[SearchResult]
+    next_cursor: str | None = None
+
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+    hit_ratio: float
+
+
+class CacheStatus(BaseModel):
+    user: CacheStats
+    response: CacheStats
+
+
+class ImportRowError(BaseModel):
+    line: int
+    detail: str
+
+
+class ImportReport(BaseModel):
+    received: int
+    inserted: int
+    authors_created: int
+    error_count: int
+    errors: list[ImportRowError]
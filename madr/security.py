@@ -1,22 +1,101 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from http import HTTPStatus
+from threading import Lock
+from time import monotonic, perf_counter
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jwt import DecodeError, ExpiredSignatureError, PyJWTError, decode, encode
 from pwdlib import PasswordHash
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from pwdlib.hashers.argon2 import Argon2Hasher
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from zoneinfo import ZoneInfo
 
-from madr.database import get_session
-from madr.models import User
+from madr.cache import TTLCache
+from madr.database import get_read_session
+from madr.metrics import password_hash_duration
+from madr.models import DeletedUser, User
 from madr.schemas import TokenData
 from madr.settings import Settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
-pwd_context = PasswordHash.recommended()
 settings = Settings()
+pwd_context = PasswordHash((
+    Argon2Hasher(
+        time_cost=settings.ARGON2_TIME_COST,
+        memory_cost=settings.ARGON2_MEMORY_COST,
+        parallelism=settings.ARGON2_PARALLELISM,
+    ),
+))
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class CurrentUser:
+    """Detached snapshot of the authenticated user, safe to cache."""
+
+    id: int
+    username: str
+    email: str
+    token_version: int = 0
+
+
+class HashingPool:
+    """Dedicated threads for Argon2, which releases the GIL while hashing.
+
+    At most ``workers + queue_size`` tasks may be pending; beyond that
+    requests fail fast with 503 instead of piling up behind the hashing.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='argon2'
+        )
+        self.capacity = workers + queue_size
+        self.lock = Lock()
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, func, *args):
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                detail='Server busy, try again later',
+                headers={'Retry-After': '1'},
+            )
+
+        def timed():
+            start = perf_counter()
+            try:
+                return func(*args)
+            finally:
+                password_hash_duration.observe(
+                    perf_counter() - start, operation=func.__name__
+                )
+
+        with self.lock:
+            self.pending += 1
+        job = self.executor.submit(timed)
+        # Released when the job ends, not when its request stops waiting:
+        # a cancelled request leaves the hashing running in its thread
+        job.add_done_callback(self._release)
+        return await asyncio.wrap_future(job)
+
+    def _release(self, job):
+        with self.lock:
+            self.pending -= 1
+
+
+hashing_pool = HashingPool(
+    settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE
+)
 
 
 def get_password_hash(password: str):
@@ -27,6 +106,19 @@ def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password(password: str) -> str:
+    return await hashing_pool.run(get_password_hash, password)
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Verify a password; also return a new hash if the cost changed."""
+    return await hashing_pool.run(
+        pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(tz=ZoneInfo('UTC')) + timedelta(
@@ -39,15 +131,113 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
-def get_current_user(
-    session: Session = Depends(get_session),
-    token: str = Depends(oauth2_scheme),
-):
-    credentials_exception = HTTPException(
-        status_code=HTTPStatus.UNAUTHORIZED,
-        detail='Could not validate credentials',
-        headers={'WWW-Authenticate': 'Bearer'},
-    )
+def token_claims(user) -> dict:
+    """What an access token says about ``user``.
+
+    ``uid``, ``username`` and ``ver`` let ``get_current_reader`` trust the
+    token without loading the user; ``ver`` is the user's token version,
+    bumped to revoke every token issued before.
+    """
+    return {
+        'sub': user.email,
+        'uid': user.id,
+        'username': user.username,
+        'ver': user.token_version,
+    }
+
+
+class TokenVersions:
+    """Every user's current token version, kept in memory.
+
+    Reloaded every ``TOKEN_VERSION_REFRESH_SECONDS`` to pick up the bumps
+    made by other workers; this worker's own bumps apply at once. After
+    the first load only the users updated since the previous one are read,
+    and the deleted ones come from their ``deleted_users`` rows. If the
+    reloads stop for three intervals the table counts as stale: every
+    token goes back to being checked against the database and the next
+    reload reads every user again.
+    """
+
+    # updated_at is when the writing transaction started, which may commit
+    # after a reload has gone past it: each reload reads back this far
+    overlap = timedelta(minutes=1)
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.versions = {}
+        self.loaded_at = None
+        self.since = None
+
+    def _stale(self) -> bool:
+        return (
+            self.loaded_at is None
+            or monotonic() - self.loaded_at > 3 * self.refresh_seconds
+        )
+
+    async def load(self, session: AsyncSession):
+        now = await session.scalar(select(func.now()))
+        query = select(User.id, User.token_version)
+        if self._stale():
+            rows = await session.execute(query)
+            self.versions = dict(rows.all())
+        else:
+            since = self.since - self.overlap
+            rows = await session.execute(query.where(User.updated_at > since))
+            self.versions.update(rows.all())
+            deleted = await session.scalars(
+                select(DeletedUser.user_id).where(
+                    DeletedUser.deleted_at > since
+                )
+            )
+            for user_id in deleted:
+                self.versions.pop(user_id, None)
+        self.since = now
+        self.loaded_at = monotonic()
+
+    async def refresh_forever(self, session_factory):
+        while True:
+            try:
+                async with session_factory() as session:
+                    await self.load(session)
+            except Exception:
+                logger.exception('Could not reload the token versions')
+            await asyncio.sleep(self.refresh_seconds)
+
+    def is_current(self, user_id: int | None, version: int | None) -> bool:
+        """False when unsure: unknown user, old version or stale table."""
+        if self._stale():
+            return False
+        return user_id is not None and self.versions.get(user_id) == version
+
+    def set(self, user_id: int, version: int):
+        self.versions[user_id] = version
+
+    def discard(self, user_id: int):
+        self.versions.pop(user_id, None)
+
+    @staticmethod
+    async def record_deletion(session: AsyncSession, user_id: int):
+        """Leave the ``deleted_users`` row of ``user_id`` in the session's
+        transaction, and prune the rows older than any token."""
+        session.add(DeletedUser(user_id=user_id))
+        lifetime = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        await session.execute(
+            delete(DeletedUser).where(
+                DeletedUser.deleted_at < func.now() - lifetime
+            )
+        )
+
+
+token_versions = TokenVersions(settings.TOKEN_VERSION_REFRESH_SECONDS)
+
+credentials_exception = HTTPException(
+    status_code=HTTPStatus.UNAUTHORIZED,
+    detail='Could not validate credentials',
+    headers={'WWW-Authenticate': 'Bearer'},
+)
+
+
+def decode_token(token: str) -> dict:
     try:
         payload = decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
@@ -55,19 +245,63 @@ def get_current_user(
         username: str = payload.get('sub')
         if not username:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        TokenData(username=username)
     except DecodeError:
         raise credentials_exception
     except ExpiredSignatureError:
         raise credentials_exception
     except PyJWTError:
         raise credentials_exception  # pragma: no cover
+    return payload
 
-    user = session.scalar(
-        select(User).where(User.email == token_data.username)
-    )
 
+async def get_current_user(
+    session: AsyncSession = Depends(get_read_session),
+    token: str = Depends(oauth2_scheme),
+):
+    payload = decode_token(token)
+    email = payload['sub']
+
+    user = user_cache.get(email)
     if not user:
+        db_user = await session.scalar(select(User).where(User.email == email))
+
+        if not db_user:
+            raise credentials_exception
+
+        user = CurrentUser(
+            id=db_user.id,
+            username=db_user.username,
+            email=db_user.email,
+            token_version=db_user.token_version,
+        )
+        user_cache.set(email, user)
+
+    # Tokens issued before the version was bumped are revoked, and so are
+    # those that do not say which version they were issued for
+    if payload.get('ver') != user.token_version:
         raise credentials_exception
 
     return user
+
+
+async def get_current_reader(
+    session: AsyncSession = Depends(get_read_session),
+    token: str = Depends(oauth2_scheme),
+):
+    """``get_current_user`` for handlers that only read.
+
+    With ``STATELESS_AUTH`` a token whose version is current is enough:
+    the user comes from its claims, without a cache lookup or a query.
+    The session is only used when falling back to ``get_current_user``.
+    """
+    if settings.STATELESS_AUTH:
+        payload = decode_token(token)
+        if token_versions.is_current(payload.get('uid'), payload.get('ver')):
+            return CurrentUser(
+                id=payload['uid'],
+                username=payload['username'],
+                email=payload['sub'],
+                token_version=payload['ver'],
+            )
+    return await get_current_user(session, token)
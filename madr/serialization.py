@@ -0,0 +1,72 @@
+from typing import get_args
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+
+from madr.settings import Settings
+
+settings = Settings()
+
+
+class PydanticJSONResponse(JSONResponse):
+    """JSON response encoded by pydantic-core instead of ``json.dumps``.
+
+    Bytes are taken as an already encoded body and sent untouched.
+    """
+
+    def render(self, content) -> bytes:  # noqa: PLR6301
+        if isinstance(content, bytes):
+            return content
+        return to_json(content)
+
+
+class ListSerializer:
+    """Encode a page of rows as a ``*List`` schema, straight to JSON bytes.
+
+    ``rows`` are the tuples of a ``select()`` of the item schema's columns,
+    in field order. With ``FAST_SERIALIZATION`` they are trusted as they
+    come from the database: the models are built with ``model_construct``
+    and never validated. Otherwise they go through the same validation
+    as a ``response_model``.
+    """
+
+    def __init__(self, model: type[BaseModel], field: str):
+        self.model = model
+        self.field = field
+        (self.item,) = get_args(model.model_fields[field].annotation)
+        self.item_fields = tuple(self.item.model_fields)
+        self.adapter = TypeAdapter(model)
+
+    def columns(self, entity) -> list:
+        """The ``entity`` attributes to select, in the order ``dump`` wants."""
+        return [getattr(entity, field) for field in self.item_fields]
+
+    def dump(
+        self,
+        rows,
+        next_cursor: str | None = None,
+        *,
+        entities: bool = False,
+        **extra,
+    ) -> bytes:
+        """Encode ``rows``; ``entities`` are ORM objects, always validated.
+
+        ``extra`` fills the schema's other fields, such as ``missing``.
+        """
+        if settings.FAST_SERIALIZATION and not entities:
+            construct, fields = self.item.model_construct, self.item_fields
+            page = self.model.model_construct(**{
+                self.field: [
+                    construct(**dict(zip(fields, row))) for row in rows
+                ],
+                'next_cursor': next_cursor,
+                **extra,
+            })
+        else:
+            page = self.adapter.validate_python(
+                {self.field: rows, 'next_cursor': next_cursor, **extra},
+                from_attributes=True,
+            )
+
+        return self.adapter.dump_json(page)
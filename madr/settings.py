@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,3 +12,42 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30
+    DATABASE_POOL_RECYCLE: int = -1
+    DATABASE_POOL_PRE_PING: bool = False
+    # Behind pgbouncer the pooling is done there: one connection per checkout
+    DATABASE_NULL_POOL: bool = False
+    # Read-only handlers go to these when set, as a JSON list of URLs
+    DATABASE_REPLICA_URLS: list[str] = []
+    DATABASE_REPLICA_STRATEGY: Literal['round_robin', 'least_connections'] = (
+        'round_robin'
+    )
+    READ_YOUR_WRITES_SECONDS: float = 5
+
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: float = 60
+
+    # Read endpoints trust the token claims while the token version is
+    # current, instead of loading the user
+    STATELESS_AUTH: bool = False
+    TOKEN_VERSION_REFRESH_SECONDS: float = 30
+
+    RESPONSE_CACHE_SIZE: int = 4096
+    RESPONSE_CACHE_TTL: float = 300
+    # Build list pages from trusted rows without validating them again
+    FAST_SERIALIZATION: bool = False
+
+    # Per request, over which a warning is logged; 0 turns a check off
+    QUERY_BUDGET_STATEMENTS: int = 20
+    QUERY_BUDGET_SECONDS: float = 0.5
+    # The same statement run more times than this looks like an N+1
+    QUERY_REPEAT_LIMIT: int = 3
+
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 16
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536
+    ARGON2_PARALLELISM: int = 4
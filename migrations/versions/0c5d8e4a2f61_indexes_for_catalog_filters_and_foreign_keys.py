@@ -0,0 +1,39 @@
+"""indexes for catalog filters and foreign keys
+
+Revision ID: 0c5d8e4a2f61
+Revises: f3a9c2d71b04
+Create Date: 2026-10-17 16:20:44.508213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c5d8e4a2f61'
+down_revision: Union[str, None] = 'f3a9c2d71b04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_books_author_id_year', 'books', ['author_id', 'year']),
+    ('ix_books_managed_by_user', 'books', ['managed_by_user']),
+    ('ix_books_year_id', 'books', ['year', 'id']),
+    ('ix_authors_managed_by_user', 'authors', ['managed_by_user']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the tables writable while the indexes build, but
+    # cannot run inside a transaction. If a build fails it leaves an
+    # INVALID index behind: drop it and run the upgrade again.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
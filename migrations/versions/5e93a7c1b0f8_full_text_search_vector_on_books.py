@@ -0,0 +1,68 @@
+"""full text search vector on books
+
+Revision ID: 5e93a7c1b0f8
+Revises: 8b1f0c6e2d4a
+Create Date: 2026-10-17 10:03:18.552904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e93a7c1b0f8'
+down_revision: Union[str, None] = '8b1f0c6e2d4a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.execute("""
+        CREATE OR REPLACE FUNCTION books_search_vector_update()
+        RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A')
+                || setweight(to_tsvector('simple', coalesce(
+                    (SELECT name FROM authors WHERE id = NEW.author_id), ''
+                )), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER books_search_vector
+        BEFORE INSERT OR UPDATE OF title, author_id ON books
+        FOR EACH ROW EXECUTE FUNCTION books_search_vector_update()
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION authors_search_vector_update()
+        RETURNS trigger AS $$
+        BEGIN
+            UPDATE books SET title = title WHERE author_id = NEW.id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER authors_search_vector
+        AFTER UPDATE OF name ON authors
+        FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+        EXECUTE FUNCTION authors_search_vector_update()
+    """)
+    # Fill the column for existing rows through the trigger
+    op.execute('UPDATE books SET title = title')
+    op.create_index('ix_books_search_vector', 'books', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_search_vector', table_name='books', postgresql_using='gin')
+    op.execute('DROP TRIGGER authors_search_vector ON authors')
+    op.execute('DROP FUNCTION authors_search_vector_update()')
+    op.execute('DROP TRIGGER books_search_vector ON books')
+    op.execute('DROP FUNCTION books_search_vector_update()')
+    op.drop_column('books', 'search_vector')
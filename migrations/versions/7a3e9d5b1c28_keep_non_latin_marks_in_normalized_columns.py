@@ -0,0 +1,88 @@
+"""keep non-latin marks in normalized columns
+
+Revision ID: 7a3e9d5b1c28
+Revises: 0c5d8e4a2f61
+Create Date: 2026-10-17 18:41:09.230114
+
+"""
+import re
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3e9d5b1c28'
+down_revision: Union[str, None] = '0c5d8e4a2f61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = [
+    ('books', 'title', 'title_normalized'),
+    ('authors', 'name', 'name_normalized'),
+]
+BATCH_SIZE = 1000
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(value: str) -> str:
+    # Frozen copy of madr.normalization.normalize as of this revision:
+    # combining marks are only dropped after Latin, Greek and Cyrillic
+    # letters. Rows folded by e61b0d3f9a72 lost every mark, and are
+    # rewritten from their display column
+    kept = []
+    drop_marks = False
+    for char in unicodedata.normalize('NFKD', value.casefold()):
+        if unicodedata.category(char).startswith('M'):
+            if not drop_marks:
+                kept.append(char)
+            continue
+        if not (char.isalnum() or char == '_' or char.isspace()):
+            drop_marks = True
+            continue
+        drop_marks = unicodedata.name(char, '').startswith(
+            ('LATIN', 'GREEK', 'CYRILLIC')
+        )
+        kept.append(char)
+    composed = unicodedata.normalize('NFC', ''.join(kept))
+    return _WHITESPACE.sub(' ', composed).strip()
+
+
+def upgrade() -> None:
+    # The new form only tells more values apart, so rewriting the rows
+    # cannot break the unique constraints
+    connection = op.get_bind()
+    for table_name, source, target in COLUMNS:
+        table = sa.table(
+            table_name, sa.column('id'), sa.column(source), sa.column(target)
+        )
+        last_id = 0
+        while rows := connection.execute(
+            sa.select(table.c.id, table.c[source], table.c[target])
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(BATCH_SIZE)
+        ).all():
+            changed = [
+                {'row_id': id, 'normalized': normalize(value)}
+                for id, value, stored in rows
+                if normalize(value) != stored
+            ]
+            if changed:
+                connection.execute(
+                    table.update()
+                    .where(table.c.id == sa.bindparam('row_id'))
+                    .values({target: sa.bindparam('normalized')}),
+                    changed,
+                )
+            last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    # Folding the marks away again could merge titles that are distinct
+    # by now and fail on the unique constraints: the finer values stay,
+    # and only rows written after the downgrade use the old form
+    pass
@@ -0,0 +1,46 @@
+"""incremental token versions reload
+
+Revision ID: 9d4c2b7e6f13
+Revises: 7a3e9d5b1c28
+Create Date: 2026-10-17 20:12:37.581046
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4c2b7e6f13'
+down_revision: Union[str, None] = '7a3e9d5b1c28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('deleted_users',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index('ix_deleted_users_deleted_at', 'deleted_users', ['deleted_at'])
+    # See 0c5d8e4a2f61 about CONCURRENTLY
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_updated_at',
+            'users',
+            ['updated_at'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_users_updated_at',
+            table_name='users',
+            postgresql_concurrently=True,
+        )
+    op.drop_index('ix_deleted_users_deleted_at', table_name='deleted_users')
+    op.drop_table('deleted_users')
@@ -0,0 +1,30 @@
+"""unique book titles and author names
+
+Revision ID: a4d27c9e51b3
+Revises: 5e93a7c1b0f8
+Create Date: 2026-10-17 11:26:05.871420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d27c9e51b3'
+down_revision: Union[str, None] = '5e93a7c1b0f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fails if duplicates slipped past the old check-then-insert; merge
+    # them by hand before upgrading.
+    op.create_unique_constraint('authors_name_key', 'authors', ['name'])
+    op.create_unique_constraint('books_title_key', 'books', ['title'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('books_title_key', 'books', type_='unique')
+    op.drop_constraint('authors_name_key', 'authors', type_='unique')
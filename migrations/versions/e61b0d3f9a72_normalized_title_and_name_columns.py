@@ -0,0 +1,75 @@
+"""normalized title and name columns
+
+Revision ID: e61b0d3f9a72
+Revises: a4d27c9e51b3
+Create Date: 2026-10-17 14:02:37.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from madr.normalization import normalize
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e61b0d3f9a72'
+down_revision: Union[str, None] = 'a4d27c9e51b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = [
+    ('books', 'title', 'title_normalized'),
+    ('authors', 'name', 'name_normalized'),
+]
+
+
+def _backfill(table_name: str, source: str, target: str) -> None:
+    table = sa.table(
+        table_name, sa.column('id'), sa.column(source), sa.column(target)
+    )
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(table.c.id, table.c[source])).all()
+    if rows:
+        connection.execute(
+            table.update()
+            .where(table.c.id == sa.bindparam('row_id'))
+            .values({target: sa.bindparam('normalized')}),
+            [{'row_id': id, 'normalized': normalize(value)} for id, value in rows],
+        )
+
+
+def upgrade() -> None:
+    for table_name, source, target in COLUMNS:
+        op.add_column(table_name, sa.Column(target, sa.String(), nullable=True))
+        _backfill(table_name, source, target)
+        op.alter_column(table_name, target, nullable=False)
+
+    # Fails if two rows now fold to the same value (e.g. "Helena" and
+    # "Heléna"); merge them by hand before upgrading.
+    op.drop_constraint('books_title_key', 'books', type_='unique')
+    op.drop_constraint('authors_name_key', 'authors', type_='unique')
+    op.create_unique_constraint('books_title_normalized_key', 'books', ['title_normalized'])
+    op.create_unique_constraint('authors_name_normalized_key', 'authors', ['name_normalized'])
+
+    op.drop_index('ix_books_title_trgm', table_name='books', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.drop_index('ix_authors_name_trgm', table_name='authors', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_books_title_normalized_trgm', 'books', ['title_normalized'], unique=False, postgresql_using='gin', postgresql_ops={'title_normalized': 'gin_trgm_ops'})
+    op.create_index('ix_authors_name_normalized_trgm', 'authors', ['name_normalized'], unique=False, postgresql_using='gin', postgresql_ops={'name_normalized': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_authors_name_normalized_trgm', table_name='authors', postgresql_using='gin', postgresql_ops={'name_normalized': 'gin_trgm_ops'})
+    op.drop_index('ix_books_title_normalized_trgm', table_name='books', postgresql_using='gin', postgresql_ops={'title_normalized': 'gin_trgm_ops'})
+    op.create_index('ix_authors_name_trgm', 'authors', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_books_title_trgm', 'books', ['title'], unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+
+    op.drop_constraint('authors_name_normalized_key', 'authors', type_='unique')
+    op.drop_constraint('books_title_normalized_key', 'books', type_='unique')
+    # Display values are no longer folded: they may collide again here
+    op.create_unique_constraint('authors_name_key', 'authors', ['name'])
+    op.create_unique_constraint('books_title_key', 'books', ['title'])
+
+    for table_name, _, target in COLUMNS:
+        op.drop_column(table_name, target)
@@ -0,0 +1,26 @@
+"""token version on users
+
+Revision ID: f3a9c2d71b04
+Revises: e61b0d3f9a72
+Create Date: 2026-10-17 15:41:09.274810
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c2d71b04'
+down_revision: Union[str, None] = 'e61b0d3f9a72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
@@ -1,16 +1,26 @@
 import factory
 import factory.fuzzy
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from jwt import encode
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import NullPool
 from testcontainers.postgres import PostgresContainer
 
 from madr.app import app
-from madr.database import get_session
+from madr.database import (
+    get_read_session,
+    get_session,
+    get_session_factory,
+)
 from madr.models import Author, Book, User, table_registry
-from madr.security import get_password_hash, settings
+from madr.response_cache import response_cache
+from madr.security import get_password_hash, settings, user_cache
 
 
 class UserFactory(factory.Factory):
@@ -28,7 +38,8 @@ class BookFactory(factory.Factory):
 
     title = factory.Faker('text')
     year = factory.Faker('random_int', min=1850, max=2010)
-    user_id = 1
+    author_id = None
+    managed_by_user = None
 
 
 class AuthorFactory(factory.Factory):
@@ -36,6 +47,14 @@ class AuthorFactory(factory.Factory):
         model = Author
 
     name = factory.Faker('name')
+    managed_by_user = None
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    yield
+    user_cache.clear()
+    response_cache.clear()
 
 
 @pytest.fixture
@@ -43,8 +62,15 @@ def client(session):
     def get_session_override():
         return session
 
+    def get_session_factory_override():
+        return async_sessionmaker(session.bind, expire_on_commit=False)
+
     with TestClient(app) as client:
         app.dependency_overrides[get_session] = get_session_override
+        app.dependency_overrides[get_read_session] = get_session_override
+        app.dependency_overrides[get_session_factory] = (
+            get_session_factory_override
+        )
         yield client
 
     app.dependency_overrides.clear()
@@ -53,49 +79,88 @@ def client(session):
 @pytest.fixture(scope='session')
 def engine():
     with PostgresContainer('postgres:16', driver='psycopg') as postgres:
-        _engine = create_engine(postgres.get_connection_url())
+        # Cada teste roda em um event loop próprio; sem pool, nenhuma
+        # conexão é reaproveitada entre loops diferentes.
+        _engine = create_async_engine(
+            postgres.get_connection_url(), poolclass=NullPool
+        )
+        yield _engine
 
-        with _engine.begin():
-            yield _engine
 
+@pytest.fixture(scope='session')
+def replica_engine():
+    # Um segundo banco no papel de réplica, sem replicação: o que só
+    # existe nele mostra que a leitura foi parar lá
+    with PostgresContainer('postgres:16', driver='psycopg') as postgres:
+        _engine = create_async_engine(
+            postgres.get_connection_url(), poolclass=NullPool
+        )
+        yield _engine
 
-@pytest.fixture
-def session(engine):
-    table_registry.metadata.create_all(engine)
 
-    with Session(engine) as session:
+@pytest_asyncio.fixture
+async def session(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
-        session.rollback()
+        await session.rollback()
 
-    table_registry.metadata.drop_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.drop_all)
 
 
-@pytest.fixture
-def user(session):
+@pytest_asyncio.fixture
+async def user(session):
     password = 'testtest'
     user = UserFactory(password=get_password_hash(password))
 
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
 
     user.clean_password = 'testtest'
     return user
 
 
-@pytest.fixture
-def other_user(session):
+@pytest_asyncio.fixture
+async def other_user(session):
     password = 'testtest'
     user = UserFactory(password=get_password_hash(password))
 
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
 
     user.clean_password = 'testtest'
     return user
 
 
+@pytest_asyncio.fixture
+async def author(session, user):
+    author = AuthorFactory(name='machado de assis', managed_by_user=user.id)
+
+    session.add(author)
+    await session.commit()
+    await session.refresh(author)
+
+    return author
+
+
+@pytest_asyncio.fixture
+async def book(session, user, author):
+    book = BookFactory(
+        title='dom casmurro', author_id=author.id, managed_by_user=user.id
+    )
+
+    session.add(book)
+    await session.commit()
+    await session.refresh(book)
+
+    return book
+
+
 @pytest.fixture
 def token(client, user):
     response = client.post(
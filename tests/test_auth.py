@@ -1,6 +1,20 @@
 from http import HTTPStatus
 
+import pytest_asyncio
 from freezegun import freeze_time
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+from madr.security import pwd_context
+
+
+@pytest_asyncio.fixture
+async def weak_hash_user(session, user):
+    weak_context = PasswordHash((Argon2Hasher(time_cost=1),))
+    user.password = weak_context.hash(user.clean_password)
+    await session.commit()
+
+    return user
 
 
 def test_get_token(client, user):
@@ -86,3 +100,18 @@ def test_token_expired_dont_refresh(client, user):
         )
         assert response.status_code == HTTPStatus.UNAUTHORIZED
         assert response.json() == {'detail': 'Could not validate credentials'}
+
+
+def test_get_token_rehashes_outdated_password(client, session, weak_hash_user):
+    response = client.post(
+        '/auth/token',
+        data={
+            'username': weak_hash_user.email,
+            'password': weak_hash_user.clean_password,
+        },
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert not pwd_context.current_hasher.check_needs_rehash(
+        weak_hash_user.password
+    )
@@ -0,0 +1,143 @@
+from http import HTTPStatus
+
+
+def test_create_author(client, token):
+    response = client.post(
+        '/authors/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'name': 'Clarice Lispector'},
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json()['name'] == 'Clarice Lispector'
+
+
+def test_create_author_already_exists(client, token, author):
+    response = client.post(
+        '/authors/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'name': 'Machado de Assis'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {
+        'detail': 'Author with the same name already exists'
+    }
+
+
+def test_update_author_name_already_exists(client, token, author):
+    other = client.post(
+        '/authors/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'name': 'Lima Barreto'},
+    ).json()
+
+    response = client.patch(
+        f'/authors/{other["id"]}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'name': 'Machado de Assis'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_update_author_refuses_null_name(client, token, author):
+    response = client.patch(
+        f'/authors/{author.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'name': None},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_upsert_author_batch(client, token, author):
+    response = client.put(
+        '/authors/batch',
+        headers={'Authorization': f'Bearer {token}'},
+        json=[{'name': 'Lima Barreto'}, {'name': 'Machado de Assis'}],
+    )
+
+    authors = response.json()['authors']
+    assert response.status_code == HTTPStatus.OK
+    # O autor existente mantém a grafia com que foi cadastrado
+    assert [a['name'] for a in authors] == ['Lima Barreto', 'machado de assis']
+    assert authors[1]['id'] == author.id
+
+
+def test_export_authors(client, token, author):
+    response = client.get(
+        '/authors/export',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert '"name": "machado de assis"' in response.text
+
+
+def test_get_author_not_modified(client, token, author):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get(f'/authors/{author.id}', headers=headers).headers['ETag']
+
+    response = client.get(
+        f'/authors/{author.id}', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_delete_author_clears_books(client, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.delete(f'/authors/{book.author_id}', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'message': 'Author deleted'}
+    books = client.get('/books/', headers=headers).json()['books']
+    assert books[0]['author_id'] is None
+    assert books[0]['updated_at'] > book.updated_at.isoformat()
+
+
+def test_delete_author_not_found(client, token):
+    response = client.delete(
+        '/authors/1', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Author not found'}
+
+
+def test_get_author_expand_books(client, token, book, author):
+    response = client.get(
+        f'/authors/{author.id}?expand=books',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [b['title'] for b in response.json()['books']] == ['dom casmurro']
+
+
+def test_list_authors_expand_books_sees_new_books(client, token, book, author):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/authors/?expand=books', headers=headers)
+
+    client.post(
+        '/books/',
+        headers=headers,
+        json={'title': 'Helena', 'year': 1876, 'author_id': author.id},
+    )
+    response = client.get('/authors/?expand=books', headers=headers)
+
+    (listed,) = response.json()['authors']
+    assert [b['title'] for b in listed['books']] == ['dom casmurro', 'Helena']
+
+
+def test_list_authors_by_ids(client, token, author):
+    response = client.get(
+        f'/authors/?ids=999&ids={author.id}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    data = response.json()
+    assert [a['id'] for a in data['authors']] == [author.id]
+    assert data['missing'] == [999]
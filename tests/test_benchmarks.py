@@ -0,0 +1,31 @@
+import pytest
+
+from benchmarks.report import latency_summary, regressions
+
+
+def test_latency_summary():
+    latencies = [0.01] * 99 + [1.0]
+    summary = latency_summary(latencies, seconds=2, errors=0)
+
+    assert summary['requests'] == len(latencies)
+    assert summary['throughput'] == len(latencies) / 2
+    assert summary['p50_ms'] == pytest.approx(latencies[0] * 1000)
+    assert summary['p99_ms'] > summary['p50_ms']
+
+
+def test_regressions_respect_direction_and_tolerance():
+    baseline = {
+        'results': {
+            'list_books': {'p99_ms': 100, 'throughput': 300, 'requests': 10}
+        }
+    }
+    report = {
+        'results': {
+            # Latência dentro da tolerância, vazão bem abaixo
+            'list_books': {'p99_ms': 120, 'throughput': 200, 'requests': 1},
+            'novo': {'p99_ms': 500},
+        }
+    }
+
+    (found,) = regressions(report, baseline, tolerance=0.25)
+    assert found.startswith('list_books.throughput')
@@ -0,0 +1,534 @@
+import csv
+import json
+from http import HTTPStatus
+
+import pytest
+
+from madr.query_budget import query_budget
+
+
+def test_list_books_contains(client, token, book):
+    response = client.get(
+        '/books/?title=Casmur',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [b['id'] for b in response.json()['books']] == [book.id]
+
+
+def test_list_books_contains_escapes_wildcards(client, token, book):
+    response = client.get(
+        '/books/?title=dom_casmurro',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.json()['books'] == []
+
+
+def test_list_books_similar(client, token, book):
+    response = client.get(
+        '/books/?title=don casmuro&match=similar',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    data = response.json()
+    assert [b['id'] for b in data['books']] == [book.id]
+    assert data['next_cursor'] is None
+
+
+def test_list_books_similar_rejects_cursor(client, token, book):
+    response = client.get(
+        '/books/?title=casmurro&match=similar&cursor=WzFd',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_create_book(client, token, author):
+    response = client.post(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Quincas Borba!', 'year': 1891, 'author_id': author.id},
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json()['title'] == 'Quincas Borba!'
+
+
+def test_create_book_already_exists(client, token, book):
+    response = client.post(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Dom Casmurro', 'year': 1899, 'author_id': 1},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {
+        'detail': 'Book with the same title already exists'
+    }
+
+
+def test_create_book_author_does_not_exist(client, token, user):
+    response = client.post(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Iracema', 'year': 1865, 'author_id': 999},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Author does not exist'}
+
+
+def test_upsert_book_updates_existing(client, token, book):
+    response = client.put(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Dom Casmurro', 'year': 1900, 'author_id': 1},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['id'] == book.id
+    assert response.json()['year'] == 1900  # noqa: PLR2004
+
+
+def test_upsert_book_batch(client, token, book, author):
+    response = client.put(
+        '/books/batch',
+        headers={'Authorization': f'Bearer {token}'},
+        json=[
+            {'title': 'Helena', 'year': 1876, 'author_id': author.id},
+            {'title': 'Dom Casmurro', 'year': 1899, 'author_id': author.id},
+        ],
+    )
+
+    titles = [b['title'] for b in response.json()['books']]
+    assert response.status_code == HTTPStatus.OK
+    assert titles == ['Helena', 'Dom Casmurro']
+
+
+def test_upsert_book_managed_by_other_user(client, other_user, book):
+    token = client.post(
+        '/auth/token',
+        data={
+            'username': other_user.email,
+            'password': other_user.clean_password,
+        },
+    ).json()['access_token']
+
+    response = client.put(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Dom Casmurro', 'year': 1900, 'author_id': 1},
+    )
+
+    assert response.status_code == HTTPStatus.FORBIDDEN
+
+
+def test_export_books_ndjson(client, token, book):
+    response = client.get(
+        '/books/export?title=casmurro',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = response.text.splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])['id'] == book.id
+
+
+def test_export_books_csv(client, token, book):
+    response = client.get(
+        '/books/export?format=csv',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    rows = list(csv.reader(response.text.splitlines()))
+    assert rows[0] == [
+        'id',
+        'title',
+        'year',
+        'author_id',
+        'created_at',
+        'updated_at',
+    ]
+    assert rows[1][:2] == [str(book.id), 'dom casmurro']
+
+
+def test_list_books_not_modified(client, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/books/', headers=headers).headers['ETag']
+
+    response = client.get(
+        '/books/', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['ETag'] == etag
+
+
+def test_list_books_reads_only_the_page(client, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    # Carrega o usuário no cache
+    client.get('/books/', headers=headers)
+
+    # O ETag sai da própria página: nada percorre o resto da tabela
+    with query_budget(max_statements=1):
+        response = client.get('/books/?limit=1', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['ETag']
+
+
+def test_list_books_etag_changes_after_update(client, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/books/', headers=headers).headers['ETag']
+
+    client.patch(f'/books/{book.id}', headers=headers, json={'year': 1900})
+    response = client.get(
+        '/books/', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['ETag'] != etag
+
+
+def test_update_book_if_match(client, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    stale = client.patch(
+        f'/books/{book.id}', headers=headers, json={'year': 1900}
+    ).headers['ETag']
+    client.patch(f'/books/{book.id}', headers=headers, json={'year': 1901})
+
+    # Um If-Match com a versão antiga não pode sobrescrever a nova
+    response = client.patch(
+        f'/books/{book.id}',
+        headers={**headers, 'If-Match': stale},
+        json={'year': 1902},
+    )
+
+    assert response.status_code == HTTPStatus.PRECONDITION_FAILED
+
+
+def test_list_books_cache_invalidated_on_create(client, token, author):
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/books/', headers=headers).json()['books'] == []
+
+    client.post(
+        '/books/',
+        headers=headers,
+        json={
+            'title': 'Memórias Póstumas',
+            'year': 1881,
+            'author_id': author.id,
+        },
+    )
+    response = client.get('/books/', headers=headers)
+
+    assert [b['title'] for b in response.json()['books']] == [
+        'Memórias Póstumas'
+    ]
+
+
+def test_update_book_managed_by_other_user(client, other_user, book):
+    token = client.post(
+        '/auth/token',
+        data={
+            'username': other_user.email,
+            'password': other_user.clean_password,
+        },
+    ).json()['access_token']
+
+    response = client.patch(
+        f'/books/{book.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'year': 1900},
+    )
+
+    assert response.status_code == HTTPStatus.FORBIDDEN
+    assert response.json() == {
+        'detail': 'You do not have permission to modify this book'
+    }
+
+
+def test_update_book_not_found(client, token):
+    response = client.patch(
+        '/books/1',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'year': 1900},
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Book not found'}
+
+
+def test_update_book_title_already_exists(client, token, book, author):
+    other = client.post(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Helena', 'year': 1876, 'author_id': author.id},
+    ).json()
+
+    response = client.patch(
+        f'/books/{other["id"]}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Dom Casmurro'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {
+        'detail': 'Book with the same title already exists'
+    }
+
+
+def test_delete_book(client, token, book):
+    response = client.delete(
+        f'/books/{book.id}', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'message': 'Book deleted'}
+
+
+def test_delete_book_not_found(client, token):
+    response = client.delete(
+        '/books/1', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_list_books_matches_without_accents(client, token, author):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post(
+        '/books/',
+        headers=headers,
+        json={'title': 'O Cortiço', 'year': 1890, 'author_id': author.id},
+    )
+
+    response = client.get('/books/?title=cortico', headers=headers)
+
+    assert [b['title'] for b in response.json()['books']] == ['O Cortiço']
+
+
+def test_create_book_already_exists_with_other_spelling(client, token, book):
+    response = client.post(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'DOM CÁSMURRO', 'year': 1899, 'author_id': 1},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_list_books_expand_author(client, token, book, author):
+    response = client.get(
+        '/books/?expand=author',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    (listed,) = response.json()['books']
+    assert response.status_code == HTTPStatus.OK
+    assert listed['author']['id'] == author.id
+    assert listed['author']['name'] == 'machado de assis'
+
+
+def test_list_books_expand_author_constant_queries(client, token, author):
+    headers = {'Authorization': f'Bearer {token}'}
+    for title in ['Helena', 'Iaiá Garcia', 'Esaú e Jacó']:
+        client.post(
+            '/books/',
+            headers=headers,
+            json={'title': title, 'year': 1900, 'author_id': author.id},
+        )
+
+    with query_budget() as one_row:
+        client.get('/books/?expand=author&limit=1', headers=headers)
+    with query_budget(repeat_limit=1) as three_rows:
+        client.get('/books/?expand=author&limit=3', headers=headers)
+
+    # Uma só consulta para a página, com ou sem mais livros
+    assert len(three_rows.statements) == len(one_row.statements)
+
+
+def test_list_books_exact_count(client, token, book, author):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post(
+        '/books/',
+        headers=headers,
+        json={'title': 'Helena', 'year': 1876, 'author_id': author.id},
+    )
+
+    response = client.get('/books/?count=exact&limit=1', headers=headers)
+
+    # O total ignora a paginação
+    assert len(response.json()['books']) == 1
+    assert response.headers['X-Total-Count'] == '2'
+    assert 'X-Total-Count-Estimated' not in response.headers
+
+
+def test_list_books_exact_count_from_the_last_page(client, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    # Carrega o usuário no cache
+    client.get('/books/', headers=headers)
+
+    # A página não está cheia: o total sai dela, sem COUNT
+    with query_budget(max_statements=1):
+        response = client.get('/books/?count=exact&limit=5', headers=headers)
+
+    assert response.headers['X-Total-Count'] == '1'
+
+
+def test_list_books_estimated_count(client, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.get('/books/?count=estimate', headers=headers)
+    cached = client.get('/books/?count=estimate', headers=headers)
+
+    assert int(response.headers['X-Total-Count']) >= 0
+    assert response.headers['X-Total-Count-Estimated'] == 'true'
+    assert cached.headers['X-Total-Count'] == response.headers['X-Total-Count']
+
+
+def test_list_books_without_count(client, token, book):
+    response = client.get(
+        '/books/', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert 'X-Total-Count' not in response.headers
+
+
+def test_list_books_by_ids_keeps_order(client, token, book, author):
+    headers = {'Authorization': f'Bearer {token}'}
+    other = client.post(
+        '/books/',
+        headers=headers,
+        json={'title': 'Helena', 'year': 1876, 'author_id': author.id},
+    ).json()
+
+    with query_budget(max_statements=1):
+        response = client.get(
+            f'/books/?ids={other["id"]}&ids=999&ids={book.id}&ids={book.id}',
+            headers=headers,
+        )
+
+    data = response.json()
+    assert [b['id'] for b in data['books']] == [other['id'], book.id]
+    assert data['missing'] == [999]
+
+
+def test_list_books_too_many_ids(client, token):
+    ids = '&'.join(f'ids={id}' for id in range(501))
+
+    response = client.get(
+        f'/books/?{ids}', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_get_book_by_id(client, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.get(f'/books/{book.id}', headers=headers)
+    cached = client.get(
+        f'/books/{book.id}',
+        headers={**headers, 'If-None-Match': response.headers['ETag']},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['title'] == 'dom casmurro'
+    assert cached.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_get_book_by_id_not_found(client, token):
+    response = client.get(
+        '/books/999', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Book not found'}
+
+
+def test_list_books_year_range_and_author(client, token, author):
+    headers = {'Authorization': f'Bearer {token}'}
+    for title, year in [('Helena', 1876), ('Iaiá Garcia', 1878)]:
+        client.post(
+            '/books/',
+            headers=headers,
+            json={'title': title, 'year': year, 'author_id': author.id},
+        )
+    client.post(
+        '/books/', headers=headers, json={'title': 'Sem autor', 'year': 1877}
+    )
+
+    response = client.get(
+        f'/books/?year_min=1877&year_max=1880&author_id={author.id}',
+        headers=headers,
+    )
+
+    assert [b['title'] for b in response.json()['books']] == ['Iaiá Garcia']
+
+
+def test_list_books_sorted_by_year_desc_with_cursor(client, token, author):
+    headers = {'Authorization': f'Bearer {token}'}
+    for title, year in [('A', 1900), ('B', 1950), ('C', 1950), ('D', 1920)]:
+        client.post(
+            '/books/',
+            headers=headers,
+            json={'title': title, 'year': year, 'author_id': author.id},
+        )
+
+    titles = []
+    cursor = ''
+    while cursor is not None:
+        page = client.get(
+            f'/books/?sort=-year&limit=2&cursor={cursor}', headers=headers
+        ).json()
+        titles += [b['title'] for b in page['books']]
+        cursor = page['next_cursor']
+
+    # Empates no ano saem pelo id, na mesma direção
+    assert titles == ['C', 'B', 'D', 'A']
+
+
+def test_list_books_sorted_by_title(client, token, author):
+    headers = {'Authorization': f'Bearer {token}'}
+    for title in ['Esaú e Jacó', 'Dom Casmurro', 'Helena']:
+        client.post(
+            '/books/',
+            headers=headers,
+            json={'title': title, 'year': 1900, 'author_id': author.id},
+        )
+
+    response = client.get('/books/?sort=title', headers=headers)
+
+    assert [b['title'] for b in response.json()['books']] == [
+        'Dom Casmurro',
+        'Esaú e Jacó',
+        'Helena',
+    ]
+
+
+@pytest.mark.parametrize('field', ['title', 'year'])
+def test_update_book_refuses_null(client, token, book, field):
+    response = client.patch(
+        f'/books/{book.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={field: None},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_update_book_author_does_not_exist(client, token, book):
+    response = client.patch(
+        f'/books/{book.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'author_id': 999},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Author does not exist'}
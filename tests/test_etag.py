@@ -0,0 +1,77 @@
+from datetime import datetime
+from http import HTTPStatus
+
+from fastapi import Request
+
+from madr.etag import (
+    collection_etag,
+    entity_etag,
+    if_match_criteria,
+    not_modified,
+)
+from madr.models import Book
+
+
+def make_request(**headers):
+    return Request({
+        'type': 'http',
+        'headers': [
+            (name.replace('_', '-').encode(), value.encode())
+            for name, value in headers.items()
+        ],
+    })
+
+
+def test_entity_etag_changes_with_updated_at():
+    first = entity_etag(1, datetime(2024, 1, 1, 12, 0, 0, 1))
+    second = entity_etag(1, datetime(2024, 1, 1, 12, 0, 0, 2))
+
+    assert first == '"1.20240101120000000001"'
+    assert first != second
+
+
+def test_collection_etag_depends_on_rows_and_params():
+    versions = [(1, datetime(2024, 1, 1)), (2, datetime(2024, 1, 2))]
+
+    assert collection_etag(versions, 'a') == collection_etag(versions, 'a')
+    assert collection_etag(versions, 'a') != collection_etag(versions, 'b')
+    assert collection_etag(versions, 'a') != collection_etag(versions[:1], 'a')
+    assert collection_etag(versions).startswith('W/"')
+
+
+def test_not_modified_matches_weakly():
+    etag = collection_etag([])
+    request = make_request(if_none_match=f'"other", {etag.lstrip("W/")}')
+
+    response = not_modified(request, etag)
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['ETag'] == etag
+
+
+def test_not_modified_without_header():
+    assert not_modified(make_request(), '"1.1"') is None
+
+
+def test_if_match_criteria_without_header():
+    assert if_match_criteria(make_request(), 1, Book.updated_at) == []
+    assert (
+        if_match_criteria(make_request(if_match='*'), 1, Book.updated_at) == []
+    )
+
+
+def test_if_match_criteria_parses_versions():
+    updated_at = datetime(2024, 1, 1, 12, 0, 0, 1)
+    request = make_request(if_match=f'{entity_etag(1, updated_at)}, "2.1"')
+
+    (criterion,) = if_match_criteria(request, 1, Book.updated_at)
+
+    assert criterion.right.value == [updated_at]
+
+
+def test_if_match_criteria_matches_nothing_for_other_rows():
+    request = make_request(if_match='"2.20240101120000000001"')
+
+    (criterion,) = if_match_criteria(request, 1, Book.updated_at)
+
+    assert str(criterion) == 'false'
@@ -0,0 +1,67 @@
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from madr.metrics import Counter, Histogram, query_duration
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency', 'Latency.', ('route',), buckets=(1, 5))
+    for value in [0.5, 1, 3, 10]:
+        histogram.observe(value, route='/books/')
+
+    lines = histogram.render()
+
+    assert 'latency_bucket{route="/books/",le="1"} 2' in lines
+    assert 'latency_bucket{route="/books/",le="5"} 3' in lines
+    assert 'latency_bucket{route="/books/",le="+Inf"} 4' in lines
+    assert 'latency_sum{route="/books/"} 14.5' in lines
+    assert 'latency_count{route="/books/"} 4' in lines
+
+
+def test_counter_callback_without_value():
+    counter = Counter('pool_size', 'Pool size.', callback=lambda: None)
+
+    assert counter.render() == [
+        '# HELP pool_size Pool size.',
+        '# TYPE pool_size counter',
+    ]
+
+
+def test_read_metrics(client, token, book):
+    client.get(
+        f'/books/?title={book.title}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    response = client.get('/metrics')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'].startswith('text/plain')
+    # O rótulo é o modelo da rota, não o caminho pedido
+    assert (
+        'madr_http_request_duration_seconds_count'
+        '{method="GET",route="/books/",status="200"}'
+    ) in response.text
+    assert 'madr_db_queries_per_request_bucket{route="/books/"' in (
+        response.text
+    )
+    assert 'madr_password_hash_duration_seconds_count' in response.text
+    assert 'madr_threadpool_max_threads' in response.text
+
+
+@pytest.mark.asyncio
+async def test_failed_statement_keeps_no_start_time(session):
+    async with session.bind.connect() as connection:
+        with pytest.raises(DBAPIError):
+            await connection.execute(text('SELECT 1 / 0'))
+        await connection.rollback()
+
+        before = list(query_duration.samples())
+        await connection.execute(text('SELECT 1'))
+
+        # Nada fica pendurado na conexão, e a próxima consulta é medida
+        assert 'query_started' not in connection.info
+        assert list(query_duration.samples()) != before
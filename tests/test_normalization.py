@@ -0,0 +1,23 @@
+from madr.normalization import clean, normalize
+
+
+def test_clean_keeps_display_form():
+    assert clean('  Memórias   Póstumas! ') == 'Memórias Póstumas!'
+
+
+def test_clean_composes_accents():
+    assert clean('Memo\u0301rias') == 'Mem\u00f3rias'
+
+
+def test_normalize_folds_case_accents_and_punctuation():
+    assert normalize('  Memórias Póstumas de Brás Cubas! ') == (
+        'memorias postumas de bras cubas'
+    )
+    assert normalize('Straße') == normalize('STRASSE')
+
+
+def test_normalize_keeps_marks_outside_latin_greek_and_cyrillic():
+    assert normalize('かがみ') != normalize('かかみ')
+    assert normalize('किताब') == 'किताब'
+    assert normalize('Ἀθῆναι') == normalize('αθηναι')
+    assert normalize('Ёлка') == normalize('елка')
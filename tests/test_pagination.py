@@ -0,0 +1,61 @@
+import pytest
+from fastapi.exceptions import HTTPException
+from sqlalchemy import select
+
+from madr.models import Book
+from madr.pagination import (
+    decode_cursor,
+    encode_cursor,
+    page_total,
+    total_count,
+    total_headers,
+)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([2008, 42])
+
+    assert decode_cursor(cursor, [Book.year, Book.id]) == [2008, 42]
+
+
+@pytest.mark.parametrize('cursor', ['lalala', encode_cursor([1, 2])])
+def test_decode_invalid_cursor(cursor):
+    with pytest.raises(HTTPException):
+        decode_cursor(cursor, [Book.id])
+
+
+@pytest.mark.asyncio
+async def test_total_count_modes(session, book):
+    query = select(Book).where(Book.title_normalized.contains('casmurro'))
+
+    assert await total_count(session, query, 'exact') == 1
+    assert await total_count(session, query, 'estimate') >= 0
+    assert await total_count(session, query, 'none') is None
+
+
+def test_page_total():
+    rows = [1, 2, 3]
+
+    assert page_total(rows) == len(rows)
+    assert page_total(rows, offset=10, limit=5) == 10 + len(rows)
+    # Página cheia, por cursor ou vazia depois de um offset: não se sabe
+    assert page_total(rows, limit=3) is None
+    assert page_total(rows, cursor='abc') is None
+    assert page_total([], offset=10) is None
+
+
+@pytest.mark.asyncio
+async def test_total_count_uses_known_total(session, book):
+    query = select(Book)
+
+    assert await total_count(session, query, 'exact', known=7) == 7  # noqa: PLR2004
+    assert await total_count(session, query, 'none', known=7) is None
+
+
+def test_total_headers():
+    assert total_headers(None, 'none') == {}
+    assert total_headers(7, 'exact') == {'X-Total-Count': '7'}
+    assert total_headers(7, 'estimate') == {
+        'X-Total-Count': '7',
+        'X-Total-Count-Estimated': 'true',
+    }
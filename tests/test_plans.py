@@ -0,0 +1,241 @@
+"""Plans of the SQL each route runs, against a seeded catalog.
+
+Every case calls a route, captures the statements it sends and explains
+them on the same database. The access paths are compared with the
+snapshot in ``tests/plans/``, and some cases also require an index or
+forbid sequential scans on a table.
+
+After an intended change, rewrite the snapshots and review their diff:
+
+    UPDATE_PLAN_SNAPSHOTS=1 pytest tests/test_plans.py
+
+Plans change between major versions of PostgreSQL, so the snapshots are
+only rewritten on the one ``conftest.py`` runs (``postgres:16``).
+"""
+
+import json as json_module
+import os
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.engine import Engine
+
+from benchmarks.catalog import author_rows, book_rows
+from madr.explain import scans
+from madr.models import Author, Book
+from madr.query_budget import shape
+
+SNAPSHOTS = Path(__file__).parent / 'plans'
+UPDATE = os.environ.get('UPDATE_PLAN_SNAPSHOTS') == '1'
+SERVER_MAJOR = 16
+
+AUTHORS = 200
+BOOKS = 5000
+
+
+@pytest.fixture
+def sync_engine(session):
+    # EXPLAIN and VACUUM outside of the session the app uses
+    engine = create_engine(session.bind.url, isolation_level='AUTOCOMMIT')
+    if UPDATE:
+        with engine.connect() as conn:
+            version = conn.exec_driver_sql('SHOW server_version_num').scalar()
+        assert int(version) // 10000 == SERVER_MAJOR, (
+            f'Gere os snapshots no postgres:{SERVER_MAJOR}'
+        )
+    yield engine
+    engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def catalog(session, user, sync_engine):
+    """Enough rows that the planner prefers the indexes where it should."""
+    await session.execute(insert(Author), author_rows(AUTHORS))
+    await session.execute(insert(Book), book_rows(BOOKS, AUTHORS, user.id))
+    await session.commit()
+    # Without VACUUM the new rows stay in the pending list of the GIN
+    # indexes, which the planner prices as too slow to use
+    with sync_engine.connect() as conn:
+        conn.exec_driver_sql('VACUUM ANALYZE')
+
+
+@pytest.fixture
+def explain(sync_engine):
+    """Plans of the statements a block sends, as captured."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):  # noqa: PLR0913, PLR0917
+        if not executemany:
+            captured.append((statement, parameters))
+
+    class Capture:
+        def __enter__(self):
+            captured.clear()
+            event.listen(Engine, 'before_cursor_execute', capture)
+            return self
+
+        def __exit__(self, *exc):
+            event.remove(Engine, 'before_cursor_execute', capture)
+            self.plans = []
+            with sync_engine.connect() as conn:
+                for statement, parameters in captured:
+                    (result,) = conn.exec_driver_sql(
+                        f'EXPLAIN (FORMAT JSON) {statement}', parameters
+                    ).scalar()
+                    self.plans.append({
+                        'sql': shape(statement),
+                        'scans': scans(result['Plan']),
+                    })
+
+    return Capture
+
+
+def case(name, url, *, uses=(), no_seq_scan=(), method='GET', json=None):  # noqa
+    """A request, the indexes its plans must use and the tables they must
+    not read whole."""
+    return pytest.param(method, url, json, uses, no_seq_scan, id=name)
+
+
+CASES = [
+    case(
+        'list_books',
+        '/books/?limit=20',
+        uses={'books_pkey'},
+        no_seq_scan={'books'},
+    ),
+    case(
+        'list_books_next_page',
+        '/books/?cursor=WzQwMDBd&limit=20',
+        uses={'books_pkey'},
+        no_seq_scan={'books'},
+    ),
+    case(
+        'list_books_by_title',
+        '/books/?title=1234&limit=20',
+        uses={'ix_books_title_normalized_trgm'},
+        no_seq_scan={'books'},
+    ),
+    # A word in one title of every 15: walking the primary key is cheaper
+    case(
+        'list_books_by_common_title',
+        '/books/?title=memorias&limit=20',
+        no_seq_scan={'books'},
+    ),
+    case(
+        'list_books_by_similar_title',
+        '/books/?title=memoria rio 1234&match=similar&limit=20',
+    ),
+    case(
+        'list_books_by_author_and_years',
+        '/books/?author_id=7&year_min=1900&year_max=1950&limit=20',
+        uses={'ix_books_author_id_year'},
+        no_seq_scan={'books'},
+    ),
+    case(
+        'list_books_by_manager',
+        '/books/?managed_by_user=1&limit=20',
+        uses={'ix_books_managed_by_user'},
+        no_seq_scan={'books'},
+    ),
+    case(
+        'list_books_sorted_by_year',
+        '/books/?sort=-year&limit=20',
+        uses={'ix_books_year_id'},
+        no_seq_scan={'books'},
+    ),
+    case(
+        'list_books_sorted_by_title',
+        '/books/?sort=title&limit=20',
+        uses={'books_title_normalized_key'},
+        no_seq_scan={'books'},
+    ),
+    case(
+        'list_books_expanded',
+        '/books/?expand=author&limit=20',
+        uses={'authors_pkey'},
+        no_seq_scan={'books'},
+    ),
+    case(
+        'list_books_by_ids',
+        '/books/?ids=10&ids=2500&ids=4999',
+        uses={'books_pkey'},
+        no_seq_scan={'books'},
+    ),
+    case(
+        'get_book',
+        '/books/1234',
+        uses={'books_pkey'},
+        no_seq_scan={'books'},
+    ),
+    case('list_authors_by_name', '/authors/?name=autor 12&limit=20'),
+    case(
+        'get_author_with_books',
+        '/authors/7?expand=books',
+        uses={'ix_books_author_id_year'},
+        no_seq_scan={'books'},
+    ),
+    case(
+        'search',
+        '/search/?q=1234&limit=20',
+        uses={'ix_books_search_vector'},
+        no_seq_scan={'books'},
+    ),
+    case(
+        'update_book',
+        '/books/1234',
+        method='PATCH',
+        json={'year': 1901},
+        uses={'books_pkey'},
+        no_seq_scan={'books'},
+    ),
+    # Nulls the author of its books in the same statement
+    case(
+        'delete_author',
+        '/authors/7',
+        method='DELETE',
+        uses={'ix_books_author_id_year'},
+        no_seq_scan={'books'},
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    ('method', 'url', 'json', 'uses', 'no_seq_scan'), CASES
+)
+def test_plans(  # noqa
+    request,
+    client,
+    token,
+    catalog,
+    explain,
+    method,
+    url,
+    json,
+    uses,
+    no_seq_scan,
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    # Carrega o usuário no cache, fora das consultas capturadas
+    client.get('/users/?limit=1', headers=headers)
+
+    with explain() as captured:
+        response = client.request(method, url, headers=headers, json=json)
+    assert response.is_success
+
+    found = [scan for entry in captured.plans for scan in entry['scans']]
+    for index in uses:
+        assert any(scan.endswith(f' using {index}') for scan in found)
+    for table in no_seq_scan:
+        assert f'Seq Scan on {table}' not in found
+
+    snapshot = SNAPSHOTS / f'{request.node.callspec.id}.json'
+    if UPDATE:
+        SNAPSHOTS.mkdir(exist_ok=True)
+        snapshot.write_text(
+            json_module.dumps(captured.plans, indent=2, ensure_ascii=False)
+            + '\n'
+        )
+    assert snapshot.exists(), 'Gere com UPDATE_PLAN_SNAPSHOTS=1'
+    assert captured.plans == json_module.loads(snapshot.read_text())
@@ -0,0 +1,64 @@
+import logging
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from madr import query_budget as budget
+from madr.query_budget import (
+    QueryBudgetExceeded,
+    QueryLog,
+    query_budget,
+    shape,
+)
+
+
+def test_shape_collapses_placeholder_lists():
+    assert shape(
+        'SELECT * FROM books\n WHERE id IN (%(id_1_1)s, %(id_1_2)s)'
+    ) == shape('SELECT * FROM books WHERE id IN (%(id_1_1)s)')
+
+
+def test_query_log_problems():
+    log = QueryLog()
+    for _ in range(4):
+        log.record('SELECT * FROM authors WHERE id = %(id_1)s', 0.1)
+
+    problems = log.problems(max_statements=3, max_seconds=1, repeat_limit=3)
+
+    assert problems[0] == '4 statements, budget 3'
+    assert problems[1].startswith('4 times: SELECT * FROM authors')
+    assert log.problems(None, None, None) == []
+
+
+def test_query_budget_fails_the_block(client, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    with pytest.raises(QueryBudgetExceeded, match='budget 1'):
+        with query_budget(max_statements=1):
+            client.get('/books/', headers=headers)
+
+
+def test_request_over_budget_is_logged(
+    client, token, book, caplog, monkeypatch
+):
+    monkeypatch.setattr(budget.settings, 'QUERY_BUDGET_STATEMENTS', 1)
+
+    with caplog.at_level(logging.WARNING, logger='madr.query_budget'):
+        client.get('/books/', headers={'Authorization': f'Bearer {token}'})
+
+    (record,) = caplog.records
+    assert record.route == '/books/'
+    assert record.statements > 1
+
+
+@pytest.mark.asyncio
+async def test_query_budget_counts_failed_statements(session):
+    async with session.bind.connect() as connection:
+        with query_budget() as log:
+            with pytest.raises(DBAPIError):
+                await connection.execute(text('SELECT 1 / 0'))
+            await connection.rollback()
+            await connection.execute(text('SELECT 2'))
+
+    assert log.statements == ['SELECT 1 / 0', 'SELECT 2']
@@ -0,0 +1,144 @@
+import pytest
+import pytest_asyncio
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from madr import database
+from madr.database import (
+    PRIMARY_COOKIE,
+    ReadYourWritesMiddleware,
+    ReplicaSet,
+    get_read_session,
+    get_session,
+    read_session,
+)
+from madr.models import Author, table_registry
+
+
+def make_request(method='GET', **headers):
+    return Request({
+        'type': 'http',
+        'method': method,
+        'headers': [
+            (name.replace('_', '-').encode(), value.encode())
+            for name, value in headers.items()
+        ],
+    })
+
+
+@pytest_asyncio.fixture
+async def replica_set(replica_engine):
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+
+    yield ReplicaSet([replica_engine])
+
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.drop_all)
+
+
+async def add_author(session: AsyncSession, name: str):
+    session.add(Author(name=name, managed_by_user=None))
+    await session.commit()
+
+
+def test_round_robin_takes_replicas_in_turn(replica_engine):
+    replica_set = ReplicaSet([replica_engine, replica_engine])
+
+    assert [replica_set.pick() for _ in range(3)] == [0, 1, 0]
+
+
+@pytest.mark.asyncio
+async def test_least_connections_skips_busy_replica(replica_engine):
+    replica_set = ReplicaSet(
+        [replica_engine, replica_engine], 'least_connections'
+    )
+
+    async with replica_set.session():
+        assert replica_set.in_use == [1, 0]
+        assert replica_set.pick() == 1
+    assert replica_set.in_use == [0, 0]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ('request_', 'expected'),
+    [
+        (make_request(), 'replica'),
+        (make_request('POST'), 'primary'),
+        (make_request(cookie=f'{PRIMARY_COOKIE}=1'), 'primary'),
+        (make_request(x_read_consistency='primary'), 'primary'),
+    ],
+)
+async def test_read_session_routing(session, replica_set, request_, expected):
+    await add_author(session, 'primary')
+    async with replica_set.session() as replica:
+        await add_author(replica, 'replica')
+
+    async with read_session(request_, session, replica_set) as read:
+        used = await read.scalar(select(Author.name))
+
+    assert used == expected
+
+
+@pytest.mark.asyncio
+async def test_read_session_without_replicas(engine):
+    async with AsyncSession(engine) as primary:
+        async with read_session(
+            make_request(), primary, ReplicaSet([])
+        ) as session:
+            assert session is primary
+
+
+@pytest.mark.asyncio
+async def test_get_read_session_shares_the_write_session(engine):
+    # Uma escrita e a busca do usuário usam a mesma sessão (e conexão)
+    async with AsyncSession(engine) as primary:
+        sessions = get_read_session(make_request('POST'), primary)
+
+        assert await anext(sessions) is primary
+        await sessions.aclose()
+
+
+def test_read_your_writes_cookie_after_write():
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware, seconds=5)
+    app.get('/')(lambda: {})
+    app.post('/')(lambda: {})
+    client = TestClient(app)
+
+    assert PRIMARY_COOKIE not in client.get('/').cookies
+    assert 'Max-Age=5' in client.post('/').headers['set-cookie']
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_the_replica_until_the_client_writes(
+    session, replica_set, monkeypatch
+):
+    monkeypatch.setattr(database, 'replicas', replica_set)
+    async with replica_set.session() as replica:
+        await add_author(replica, 'só na réplica')
+
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware, seconds=5)
+    app.dependency_overrides[get_session] = lambda: session
+
+    @app.get('/authors')
+    async def names(read: AsyncSession = Depends(get_read_session)):
+        return (await read.scalars(select(Author.name))).all()
+
+    @app.post('/authors')
+    async def create(name: str, write: AsyncSession = Depends(get_session)):
+        await add_author(write, name)
+
+    client = TestClient(app)
+
+    assert client.get('/authors').json() == ['só na réplica']
+
+    client.post('/authors?name=machado')
+
+    # O cookie da escrita manda a leitura seguinte para o primário
+    assert PRIMARY_COOKIE in client.cookies
+    assert client.get('/authors').json() == ['machado']
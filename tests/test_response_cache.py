@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import update
+
+from madr.cache import TTLCache
+from madr.database import CONSISTENCY_HEADER
+from madr.models import Book
+from madr.response_cache import ResponseCache, response_cache
+
+
+def test_response_cache_key_normalizes_param_order():
+    cache = ResponseCache(TTLCache(maxsize=8, ttl=60))
+
+    assert cache.key('books', title='a', year=1) == cache.key(
+        'books', year=1, title='a'
+    )
+
+
+def test_response_cache_hit_and_miss():
+    cache = ResponseCache(TTLCache(maxsize=8, ttl=60))
+    key = cache.key('books', title='a')
+
+    assert cache.get(key) is None
+    cache.set(key, b'{}', '"1"')
+
+    assert cache.get(key).body == b'{}'
+    assert cache.stats()['hit_ratio'] == 0.5  # noqa: PLR2004
+
+
+def test_response_cache_invalidate_namespace():
+    cache = ResponseCache(TTLCache(maxsize=8, ttl=60))
+    books = cache.key('books', title='a')
+    authors = cache.key('authors', name='a')
+    cache.set(books, b'[]', '"1"')
+    cache.set(authors, b'[]', '"1"')
+
+    cache.invalidate('books')
+
+    assert cache.get(cache.key('books', title='a')) is None
+    assert cache.get(cache.key('authors', name='a')) is not None
+
+
+@pytest.mark.asyncio
+async def test_primary_reads_skip_the_cache(client, token, session, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    year = client.get(f'/books/{book.id}', headers=headers).json()['year']
+    # Escrita que o cache não viu: a entrada guardada fica velha
+    await session.execute(
+        update(Book).where(Book.id == book.id).values(year=1900)
+    )
+    await session.commit()
+
+    stale = client.get(f'/books/{book.id}', headers=headers)
+    fresh = client.get(
+        f'/books/{book.id}',
+        headers={**headers, CONSISTENCY_HEADER: 'primary'},
+    )
+
+    assert stale.json()['year'] == year
+    assert fresh.json()['year'] == 1900  # noqa: PLR2004
+
+
+def test_replica_reads_are_not_stored(client, token, session, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    session.info['replica'] = True
+
+    client.get(f'/books/{book.id}', headers=headers)
+    client.get(f'/books/{book.id}', headers=headers)
+
+    assert response_cache.stats()['hits'] == 0
@@ -0,0 +1,64 @@
+from http import HTTPStatus
+
+import pytest
+
+
+def test_search_by_title(client, token, book):
+    response = client.get(
+        '/search/?q=casmurro',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    results = response.json()['results']
+    assert [r['id'] for r in results] == [book.id]
+    assert results[0]['author_name'] == 'machado de assis'
+
+
+def test_search_by_author_name(client, token, book):
+    response = client.get(
+        '/search/?q=machado',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert [r['id'] for r in response.json()['results']] == [book.id]
+
+
+def test_search_follows_author_rename(client, token, book, author):
+    client.patch(
+        f'/authors/{author.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'name': 'joaquim maria'},
+    )
+
+    response = client.get(
+        '/search/?q=joaquim',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert [r['id'] for r in response.json()['results']] == [book.id]
+
+
+def test_search_paginates_with_cursor(client, token, book):
+    response = client.get(
+        '/search/?q=casmurro&limit=1',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    cursor = response.json()['next_cursor']
+
+    response = client.get(
+        f'/search/?q=casmurro&limit=1&cursor={cursor}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.json() == {'results': [], 'next_cursor': None}
+
+
+@pytest.mark.parametrize('limit', [0, -1, 101])
+def test_search_limit_out_of_range(client, token, limit):
+    response = client.get(
+        f'/search/?q=casmurro&limit={limit}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
@@ -1,10 +1,24 @@
+import asyncio
 from http import HTTPStatus
+from threading import Event
+from time import monotonic
 
 import pytest
 from fastapi.exceptions import HTTPException
-from jwt import decode
+from jwt import decode, encode
+from sqlalchemy import update
 
-from madr.security import create_access_token, get_current_user, settings
+from madr.models import User
+from madr.query_budget import query_budget
+from madr.security import (
+    HashingPool,
+    TokenVersions,
+    create_access_token,
+    get_current_user,
+    get_password_hash,
+    settings,
+    token_versions,
+)
 
 
 def test_jwt():
@@ -28,12 +42,198 @@ def test_jwt_invalid_token(client):
     assert response.json() == {'detail': 'Could not validate credentials'}
 
 
-def test_get_current_user_without_sub():
+@pytest.mark.asyncio
+async def test_get_current_user_without_sub():
     token = create_access_token({'test': 'test'})
     with pytest.raises(HTTPException):
-        get_current_user(token=token)
+        await get_current_user(token=token)
 
 
-def test_get_current_user_pyjwterror(session):
+@pytest.mark.asyncio
+async def test_get_current_user_pyjwterror(session):
     with pytest.raises(HTTPException):
-        get_current_user(token='lalala', session=session)
+        await get_current_user(token='lalala', session=session)
+
+
+@pytest.mark.asyncio
+async def test_hashing_pool_runs_task():
+    pool = HashingPool(workers=1, queue_size=0)
+
+    hashed = await pool.run(get_password_hash, 'testtest')
+
+    assert hashed.startswith('$argon2')
+    assert pool.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_hashing_pool_rejects_when_saturated():
+    pool = HashingPool(workers=1, queue_size=0)
+    pool.pending = 1
+
+    with pytest.raises(HTTPException) as exc_info:
+        await pool.run(get_password_hash, 'testtest')
+
+    assert exc_info.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert pool.rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_hashing_pool_cancelled_waiter_keeps_its_slot():
+    pool = HashingPool(workers=1, queue_size=0)
+    release = Event()
+    waiter = asyncio.create_task(pool.run(release.wait))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    try:
+        # O hash continua rodando na thread: a vaga só volta quando acaba
+        assert pool.pending == 1
+        with pytest.raises(HTTPException):
+            await asyncio.wait_for(pool.run(release.wait), timeout=1)
+    finally:
+        release.set()
+        pool.executor.shutdown(wait=True)
+    assert pool.pending == 0
+
+
+def test_token_carries_user_claims(token, user):
+    claims = decode(
+        token, key=settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+    )
+
+    assert claims['sub'] == user.email
+    assert claims['uid'] == user.id
+    assert claims['username'] == user.username
+    assert claims['ver'] == 0
+
+
+@pytest.mark.asyncio
+async def test_token_versions_stale_table_is_not_trusted(session, user):
+    versions = TokenVersions(refresh_seconds=30)
+    assert not versions.is_current(user.id, 0)
+
+    await versions.load(session)
+    assert versions.is_current(user.id, 0)
+    assert not versions.is_current(user.id, 1)
+
+    versions.loaded_at -= 91
+    assert not versions.is_current(user.id, 0)
+
+
+@pytest.mark.asyncio
+async def test_token_versions_reload_reads_only_changed_users(
+    session, user, other_user
+):
+    versions = TokenVersions(refresh_seconds=30)
+    await versions.load(session)
+
+    await session.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(token_version=User.token_version + 1)
+    )
+    await session.commit()
+    with query_budget() as log:
+        await versions.load(session)
+
+    assert versions.is_current(user.id, 1)
+    assert versions.is_current(other_user.id, 0)
+    assert any('updated_at >' in statement for statement in log.statements)
+
+
+@pytest.mark.asyncio
+async def test_token_versions_reload_forgets_deleted_users(session, user):
+    versions = TokenVersions(refresh_seconds=30)
+    await versions.load(session)
+
+    await session.delete(user)
+    await TokenVersions.record_deletion(session, user.id)
+    await session.commit()
+    await versions.load(session)
+
+    assert not versions.is_current(user.id, 0)
+
+
+@pytest.mark.asyncio
+async def test_token_versions_stale_table_is_read_again_whole(session, user):
+    versions = TokenVersions(refresh_seconds=30)
+    await versions.load(session)
+    versions.set(user.id + 1000, 0)
+
+    versions.loaded_at -= 91
+    await versions.load(session)
+
+    # Sem um registro da exclusão, só a releitura completa o esquece
+    assert not versions.is_current(user.id + 1000, 0)
+    assert versions.is_current(user.id, 0)
+
+
+def test_stateless_read_skips_user_query(client, token, user, monkeypatch):
+    monkeypatch.setattr(settings, 'STATELESS_AUTH', True)
+    monkeypatch.setattr(token_versions, 'versions', {user.id: 0})
+    monkeypatch.setattr(token_versions, 'loaded_at', monotonic())
+
+    with query_budget() as log:
+        response = client.get(
+            '/authors/', headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert not any('FROM users' in statement for statement in log.statements)
+
+
+def test_token_revoked_after_user_update(client, token, user):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={
+            'username': user.username,
+            'email': user.email,
+            'password': 'outrasenha',
+        },
+    )
+
+    response = client.get('/users/', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_username_change_revokes_stateless_tokens(
+    client, token, user, monkeypatch
+):
+    monkeypatch.setattr(settings, 'STATELESS_AUTH', True)
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={
+            'username': 'outronome',
+            'email': user.email,
+            'password': user.clean_password,
+        },
+    )
+    claims = decode(
+        response.json()['token']['access_token'],
+        key=settings.SECRET_KEY,
+        algorithms=[settings.ALGORITHM],
+    )
+
+    assert claims['username'] == 'outronome'
+    response = client.get('/users/', headers=headers)
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_token_without_version_is_rejected(client, user):
+    token = encode(
+        {'sub': user.email}, settings.SECRET_KEY, algorithm=settings.ALGORITHM
+    )
+
+    response = client.get(
+        '/users/', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
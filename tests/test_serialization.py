@@ -0,0 +1,44 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy.engine.result import result_tuple
+
+from madr import serialization
+from madr.schemas import BookList
+from madr.serialization import ListSerializer, PydanticJSONResponse
+
+
+@pytest.fixture(params=[False, True], ids=['validated', 'fast'])
+def fast_serialization(request, monkeypatch):
+    monkeypatch.setattr(
+        serialization.settings, 'FAST_SERIALIZATION', request.param
+    )
+
+
+def test_list_serializer_dump(fast_serialization):
+    book_list = ListSerializer(BookList, 'books')
+    make_row = result_tuple(book_list.item_fields)
+    now = datetime(2024, 8, 8, 12, 0)
+    rows = [make_row(('dom casmurro', 1899, 1, 1, now, now))]
+
+    page = json.loads(book_list.dump(rows, 'cursor'))
+
+    assert page == {
+        'books': [
+            {
+                'title': 'dom casmurro',
+                'year': 1899,
+                'author_id': 1,
+                'id': 1,
+                'created_at': '2024-08-08T12:00:00',
+                'updated_at': '2024-08-08T12:00:00',
+            }
+        ],
+        'next_cursor': 'cursor',
+    }
+
+
+def test_pydantic_json_response_keeps_encoded_body():
+    assert PydanticJSONResponse(b'{"a":1}').body == b'{"a":1}'
+    assert PydanticJSONResponse({'a': 1}).body == b'{"a":1}'
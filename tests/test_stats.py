@@ -0,0 +1,52 @@
+from http import HTTPStatus
+
+from fastapi.testclient import TestClient
+
+from madr.app import app
+from madr.database import InstrumentedQueuePool, engine_options
+from madr.settings import Settings
+
+
+def test_read_pool_status():
+    client = TestClient(app)
+
+    response = client.get('/stats/pool')
+
+    assert response.status_code == HTTPStatus.OK
+    data = response.json()
+    assert data['pool_class'] == 'InstrumentedQueuePool'
+    assert data['checked_out'] == 0
+    assert data['timeouts'] == 0
+
+
+def test_engine_options_queue_pool():
+    options = engine_options(
+        Settings(DATABASE_POOL_SIZE=20, DATABASE_POOL_PRE_PING=True)
+    )
+
+    assert options['poolclass'] is InstrumentedQueuePool
+    assert options['pool_size'] == 20  # noqa: PLR2004
+    assert options['pool_pre_ping'] is True
+
+
+def test_engine_options_null_pool():
+    options = engine_options(Settings(DATABASE_NULL_POOL=True))
+
+    assert options['poolclass'].__name__ == 'InstrumentedNullPool'
+    assert 'pool_size' not in options
+
+
+def test_read_cache_status():
+    client = TestClient(app)
+
+    response = client.get('/stats/cache')
+
+    assert response.status_code == HTTPStatus.OK
+    assert set(response.json()) == {'user', 'response'}
+    assert set(response.json()['user']) == {
+        'hits',
+        'misses',
+        'size',
+        'maxsize',
+        'hit_ratio',
+    }
@@ -53,7 +53,7 @@ def test_read_users(client, token, user):
         headers={'Authorization': f'Bearer {token}'},
     )
     assert response.status_code == HTTPStatus.OK
-    assert response.json() == {'users': [user_schema]}
+    assert response.json() == {'users': [user_schema], 'next_cursor': None}
 
 
 def test_read_users_with_users(client, token, user):
@@ -62,7 +62,28 @@ def test_read_users_with_users(client, token, user):
         '/users/',
         headers={'Authorization': f'Bearer {token}'},
         )
-    assert response.json() == {'users': [user_schema]}
+    assert response.json() == {'users': [user_schema], 'next_cursor': None}
+
+
+def test_read_users_exact_count(client, token, user, other_user):
+    response = client.get(
+        '/users/?count=exact&limit=1',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    assert len(response.json()['users']) == 1
+    assert response.headers['X-Total-Count'] == '2'
+
+
+def test_read_users_by_ids(client, token, user, other_user):
+    response = client.get(
+        f'/users/?ids={other_user.id}&ids={user.id}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    assert [u['id'] for u in response.json()['users']] == [
+        other_user.id,
+        user.id,
+    ]
+    assert response.json()['missing'] == []
 
 
 def test_get_user(client, token, user):
@@ -98,11 +119,39 @@ def test_update_user(client, user, token):
         },
     )
     assert response.status_code == HTTPStatus.OK
+    token = response.json().pop('token')
     assert response.json() == {
         'username': 'bob',
         'email': 'bob@example.com',
         'id': user.id,
+        'token': token,
     }
+    # O token antigo foi revogado: o novo vem na resposta
+    response = client.get(
+        '/users/',
+        headers={'Authorization': f'Bearer {token["access_token"]}'},
+    )
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_update_username_keeps_the_token(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={
+            'username': 'bob',
+            'email': user.email,
+            'password': user.clean_password,
+        },
+    )
+
+    assert response.json() == {
+        'username': 'bob',
+        'email': user.email,
+        'id': user.id,
+    }
+    assert client.get('/users/', headers=headers).status_code == HTTPStatus.OK
 
 
 def test_update_not_authenticated(client, user):
@@ -176,3 +225,73 @@ def test_delete_non_existent_user(client, non_existent_user_token):
     )
     assert response.status_code == HTTPStatus.UNAUTHORIZED
     assert response.json() == {'detail': 'Could not validate credentials'}
+
+
+def test_read_users_with_cursor(client, token, user, other_user):
+    response = client.get(
+        '/users/?limit=1',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    data = response.json()
+    assert [u['id'] for u in data['users']] == [user.id]
+    assert data['next_cursor']
+
+    response = client.get(
+        f'/users/?limit=1&cursor={data["next_cursor"]}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    data = response.json()
+    assert [u['id'] for u in data['users']] == [other_user.id]
+
+
+def test_read_users_invalid_cursor(client, token):
+    response = client.get(
+        '/users/?cursor=not-a-cursor',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor'}
+
+
+def test_update_user_evicts_cached_user(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/users/', headers=headers)
+
+    response = client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={
+            'username': user.username,
+            'email': user.email,
+            'password': 'mynewpassword',
+        },
+    )
+    new_token = response.json()['token']['access_token']
+    response = client.get(
+        '/users/', headers={'Authorization': f'Bearer {new_token}'}
+    )
+
+    # No cache, o usuário ainda teria a versão de token anterior
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_delete_user_invalidates_managed_books(
+    client, user, token, other_user, book
+):
+    url = f'/books/?managed_by_user={user.id}'
+    other_token = client.post(
+        '/auth/token',
+        data={
+            'username': other_user.email,
+            'password': other_user.clean_password,
+        },
+    ).json()['access_token']
+    other_headers = {'Authorization': f'Bearer {other_token}'}
+    assert len(client.get(url, headers=other_headers).json()['books']) == 1
+
+    client.delete(
+        f'/users/{user.id}', headers={'Authorization': f'Bearer {token}'}
+    )
+    response = client.get(url, headers=other_headers)
+
+    assert response.json()['books'] == []